@@ -0,0 +1,221 @@
+# Local stand-ins for the Google Maps, Overpass and Nominatim APIs used by the app.
+#
+#   python bench/mock_upstreams.py --port 9100 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+#
+# then run the app with
+#   GOOGLE_MAPS_API=http://127.0.0.1:9100/maps/api OVERPASS_URL=http://127.0.0.1:9100/api/interpreter
+#   NOMINATIM_URL=http://127.0.0.1:9100
+#
+# Facilities are generated deterministically per 0.01° cell, so overlapping queries
+# see the same places (like the real APIs) and caches behave realistically.
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CELL_DEG = 0.01
+AMENITIES = ("hospital", "clinic", "pharmacy")
+# rough share of each amenity among OSM health facilities in India
+AMENITY_WEIGHTS = (0.3, 0.3, 0.4)
+STREETS = ("MG Road", "Station Road", "Gandhi Nagar", "Nehru Street", "Main Road", "Temple Street", "Market Road")
+CITIES = ("Bengaluru", "Mumbai", "Delhi", "Chennai", "Hyderabad", "Pune", "Kolkata", "Jaipur", "Lucknow", "Patna")
+
+
+class MockConfig:
+    latency_ms = 50.0
+    jitter_ms = 25.0
+    error_rate = 0.0
+    density = 0.5  # facilities per km² (dense Indian cities are ~1-2, rural districts far less)
+
+
+@lru_cache(maxsize=200000)
+def _cell_facilities(cy, cx):
+    """Facilities in one grid cell; same cell -> same facilities on every call."""
+    rng = random.Random(cy * 1000003 + cx)
+    km2 = (CELL_DEG * 111.32) ** 2 * max(0.1, math.cos(math.radians(cy * CELL_DEG)))
+    # Poisson draw via exponential inter-arrivals
+    n, t = 0, rng.expovariate(1.0)
+    while t < MockConfig.density * km2:
+        n += 1
+        t += rng.expovariate(1.0)
+    out = []
+    for i in range(n):
+        osm_id = (abs(cy) * 40000 + abs(cx)) * 64 + i
+        out.append({
+            "osm_type": rng.choice(("node", "node", "way")),
+            "id": osm_id,
+            "amenity": rng.choices(AMENITIES, AMENITY_WEIGHTS)[0],
+            "lat": (cy + rng.random()) * CELL_DEG,
+            "lng": (cx + rng.random()) * CELL_DEG,
+            "name": f"{rng.choice(('City', 'Sri', 'Apollo', 'Care', 'Lotus', 'Janata'))} {rng.choice(('Hospital', 'Clinic', 'Medicals', 'Health Centre'))} {osm_id % 997}",
+            "street": rng.choice(STREETS),
+            "city": rng.choice(CITIES),
+            "phone": f"+91 {rng.randint(7000000000, 9999999999)}",
+        })
+    return out
+
+
+def _around(lat, lng, radius_m):
+    dlat = radius_m / 111320.0
+    dlng = radius_m / (111320.0 * max(0.01, math.cos(math.radians(lat))))
+    for cy in range(math.floor((lat - dlat) / CELL_DEG), math.floor((lat + dlat) / CELL_DEG) + 1):
+        for cx in range(math.floor((lng - dlng) / CELL_DEG), math.floor((lng + dlng) / CELL_DEG) + 1):
+            for f in _cell_facilities(cy, cx):
+                if _distance_m(lat, lng, f["lat"], f["lng"]) <= radius_m:
+                    yield f
+
+
+def _distance_m(lat1, lng1, lat2, lng2):
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371008.8 * math.hypot(x, y)
+
+
+def _by_osm_id(osm_id):
+    # ids encode their cell (India only has positive lat/lng, so the sign is implied)
+    cell, _ = divmod(int(osm_id), 64)
+    cy, cx = divmod(cell, 40000)
+    for f in _cell_facilities(cy, cx):
+        if f["id"] == int(osm_id):
+            return f
+    return None
+
+
+def _overpass_element(f):
+    tags = {"amenity": f["amenity"], "name": f["name"], "addr:street": f["street"], "addr:city": f["city"], "phone": f["phone"]}
+    if f["osm_type"] == "node":
+        return {"type": "node", "id": f["id"], "lat": f["lat"], "lon": f["lng"], "tags": tags}
+    return {"type": f["osm_type"], "id": f["id"], "center": {"lat": f["lat"], "lon": f["lng"]}, "tags": tags}
+
+
+def _geocode_point(q):
+    rng = random.Random(q.lower())
+    return 8 + rng.random() * 20, 70 + rng.random() * 18
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self):
+        delay = MockConfig.latency_ms + random.uniform(-MockConfig.jitter_ms, MockConfig.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000.0)
+        if random.random() < MockConfig.error_rate:
+            self._reply({"error": "simulated upstream failure"}, status=random.choice((429, 502, 503, 504)))
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not self._simulate():
+            return
+        if url.path.endswith("/geocode/json"):
+            lat, lng = _geocode_point(qs.get("address", ""))
+            return self._reply({"status": "OK", "results": [{"formatted_address": qs.get("address", "") + ", India",
+                                                              "geometry": {"location": {"lat": lat, "lng": lng}}}]})
+        if url.path.endswith("/place/nearbysearch/json"):
+            lat, lng = map(float, qs["location"].split(","))
+            keyword = qs.get("keyword", "hospital")
+            found = [f for f in _around(lat, lng, float(qs.get("radius", 20000))) if keyword in (f["amenity"], "hospital")]
+            results = [{"name": f["name"], "vicinity": f"{f['street']}, {f['city']}", "rating": round(3 + (f["id"] % 20) / 10, 1),
+                        "place_id": f"mock-{f['id']}", "geometry": {"location": {"lat": f["lat"], "lng": f["lng"]}}}
+                       for f in found[:20]]  # Places returns at most 20 per page
+            return self._reply({"status": "OK" if results else "ZERO_RESULTS", "results": results})
+        if url.path.endswith("/place/details/json"):
+            f = _by_osm_id(qs.get("place_id", "mock-0").split("-")[-1])
+            if f is None:
+                return self._reply({"status": "NOT_FOUND"})
+            return self._reply({"status": "OK", "result": {
+                "name": f["name"], "formatted_address": f"{f['street']}, {f['city']}, India",
+                "formatted_phone_number": f["phone"], "website": None, "rating": 4.1,
+                "geometry": {"location": {"lat": f["lat"], "lng": f["lng"]}}}})
+        if url.path == "/search":
+            lat, lng = _geocode_point(qs.get("q", ""))
+            return self._reply([{"lat": str(lat), "lon": str(lng), "display_name": qs.get("q", "")}])
+        if url.path == "/lookup":
+            out = []
+            for oid in qs.get("osm_ids", "").split(","):
+                f = _by_osm_id(oid[1:]) if oid[1:].isdigit() else None
+                if f and f["osm_type"][0].upper() == oid[0]:
+                    out.append({"osm_type": f["osm_type"], "osm_id": f["id"], "lat": str(f["lat"]), "lon": str(f["lng"]),
+                                "name": f["name"], "display_name": f"{f['name']}, {f['street']}, {f['city']}, India",
+                                "extratags": {"phone": f["phone"]}})
+            return self._reply(out)
+        self._reply({"error": "not_found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        query = self.rfile.read(length).decode()
+        if query.startswith("data="):
+            query = parse_qs(query)["data"][0]
+        if not self._simulate():
+            return
+        if not urlparse(self.path).path.endswith("/interpreter"):
+            return self._reply({"error": "not_found"}, status=404)
+        amenities = re.search(r'"amenity"~"\^\(([a-z|]+)\)\$"', query)
+        wanted = set(amenities.group(1).split("|")) if amenities else set(AMENITIES)
+        cap = re.search(r"out center (\d+)", query)
+        # outer around: clauses are unioned; a "- ...(around:...)" clause is subtracted (ring queries)
+        clauses = re.findall(r"(-?)\s*nwr(?:\[[^\]]*\])+\(around:(\d+),([-\d.]+),([-\d.]+)\)", query)
+        seen, elements = set(), []
+        exclude = [(float(r), float(la), float(lo)) for neg, r, la, lo in clauses if neg]
+        for neg, radius, lat, lng in clauses:
+            if neg:
+                continue
+            for f in _around(float(lat), float(lng), float(radius)):
+                if f["amenity"] not in wanted or f["id"] in seen:
+                    continue
+                if any(_distance_m(la, lo, f["lat"], f["lng"]) <= r for r, la, lo in exclude):
+                    continue
+                seen.add(f["id"])
+                elements.append(_overpass_element(f))
+        if cap:
+            elements = elements[:int(cap.group(1))]
+        self._reply({"version": 0.6, "generator": "mock-overpass", "elements": elements})
+
+
+def serve(port=0, latency_ms=50.0, jitter_ms=25.0, error_rate=0.0, density=0.5):
+    """Start the mock server on a background thread; returns the server (server.server_port)."""
+    MockConfig.latency_ms = latency_ms
+    MockConfig.jitter_ms = jitter_ms
+    MockConfig.error_rate = error_rate
+    MockConfig.density = density
+    _cell_facilities.cache_clear()
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Google Maps / Overpass / Nominatim APIs")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=25.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--density", type=float, default=0.5, help="facilities per km²")
+    args = parser.parse_args()
+    srv = serve(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.density)
+    print(f"mock upstreams on http://127.0.0.1:{srv.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
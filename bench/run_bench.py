@@ -0,0 +1,273 @@
+# Load-test the app's /api/* endpoints against local upstream stand-ins.
+#
+#   python bench/run_bench.py --provider osm --workers 1,2,4 --threads 1,8 --duration 20
+#   python bench/run_bench.py --provider google --compare bench/results/<previous run>.json
+#
+# For every gunicorn workers x threads combination this starts the mock upstreams
+# (bench/mock_upstreams.py) and a gunicorn server pointed at them, then drives
+# geocode / search_nearby / place_details / directions with a closed-loop load
+# generator. Throughput and p50/p95/p99 latency per endpoint are printed and saved
+# to bench/results/, and --compare flags regressions against an earlier run.
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# (name, lat, lng) of places the simulated users search around
+CITY_CENTERS = [
+    ("Bengaluru", 12.9716, 77.5946), ("Mumbai", 19.0760, 72.8777), ("Delhi", 28.6139, 77.2090),
+    ("Chennai", 13.0827, 80.2707), ("Hyderabad", 17.3850, 78.4867), ("Pune", 18.5204, 73.8567),
+    ("Kolkata", 22.5726, 88.3639), ("Jaipur", 26.9124, 75.7873), ("Lucknow", 26.8467, 80.9462),
+    ("Patna", 25.5941, 85.1376), ("Bhopal", 23.2599, 77.4126), ("Guwahati", 26.1445, 91.7362),
+]
+TYPES = ("hospital", "hospital", "clinic", "pharmacy", "all")
+# share of requests per endpoint, roughly what the UI generates per search session
+MIX = (("search_nearby", 0.45), ("geocode", 0.25), ("place_details", 0.2), ("directions", 0.1))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class LoadGenerator:
+    """Closed-loop clients: each thread sends its next request as soon as the previous one returns."""
+
+    def __init__(self, base_url, concurrency, spread_deg, seed):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.spread_deg = spread_deg
+        self.seed = seed
+        self.samples = {name: [] for name, _ in MIX}
+        self.errors = {name: 0 for name, _ in MIX}
+        self.place_ids = []
+        self._lock = threading.Lock()
+
+    def _point(self, rng):
+        _, lat, lng = rng.choice(CITY_CENTERS)
+        return lat + rng.uniform(-self.spread_deg, self.spread_deg), lng + rng.uniform(-self.spread_deg, self.spread_deg)
+
+    def _request(self, sess, rng, endpoint):
+        if endpoint == "search_nearby":
+            lat, lng = self._point(rng)
+            return sess.post(f"{self.base_url}/api/search_nearby", json={"lat": lat, "lng": lng, "type": rng.choice(TYPES)})
+        if endpoint == "geocode":
+            name = rng.choice(CITY_CENTERS)[0]
+            q = name if rng.random() < 0.7 else f"{name} railway station {rng.randint(1, 50)}"
+            return sess.post(f"{self.base_url}/api/geocode", json={"q": q})
+        if endpoint == "place_details":
+            with self._lock:
+                pid = rng.choice(self.place_ids) if self.place_ids else None
+            if pid is None:
+                return None
+            return sess.post(f"{self.base_url}/api/place_details", json={"place_id": pid})
+        lat, lng = self._point(rng)
+        return sess.post(f"{self.base_url}/api/directions", json={"dest": {"lat": lat, "lng": lng}})
+
+    def _client(self, idx, deadline, record_after):
+        rng = random.Random(self.seed * 1000 + idx)
+        names = [name for name, _ in MIX]
+        weights = [w for _, w in MIX]
+        with requests.Session() as sess:
+            while time.time() < deadline:
+                endpoint = rng.choices(names, weights)[0]
+                t0 = time.perf_counter()
+                try:
+                    r = self._request(sess, rng, endpoint)
+                    if r is None:
+                        continue
+                    ok = r.status_code < 500
+                    if endpoint == "search_nearby" and r.status_code == 200:
+                        ids = [p.get("place_id") for p in r.json().get("results", [])[:5] if p.get("place_id")]
+                        with self._lock:
+                            self.place_ids = (self.place_ids + ids)[-2000:]
+                except requests.RequestException:
+                    ok = False
+                dt = time.perf_counter() - t0
+                if time.time() >= record_after:
+                    with self._lock:
+                        self.samples[endpoint].append(dt)
+                        if not ok:
+                            self.errors[endpoint] += 1
+
+    def run(self, duration, warmup):
+        start = time.time()
+        threads = [threading.Thread(target=self._client, args=(i, start + warmup + duration, start + warmup))
+                   for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        report = {}
+        for name, samples in self.samples.items():
+            lat = sorted(samples)
+            report[name] = {
+                "requests": len(lat),
+                "errors": self.errors[name],
+                "rps": round(len(lat) / duration, 2),
+                "p50_ms": round(_percentile(lat, 50) * 1000, 2) if lat else None,
+                "p95_ms": round(_percentile(lat, 95) * 1000, 2) if lat else None,
+                "p99_ms": round(_percentile(lat, 99) * 1000, 2) if lat else None,
+            }
+        return report
+
+
+def _start_app(mock_url, provider, workers, threads, extra_env, tmpdir):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "GOOGLE_MAPS_API": f"{mock_url}/maps/api",
+        "OVERPASS_URL": f"{mock_url}/api/interpreter",
+        "NOMINATIM_URL": mock_url,
+        "UPSTREAM_MIN_INTERVAL_NOMINATIM": "0",  # the mock has no usage policy
+        "CACHE_PATH": os.path.join(tmpdir, f"cache-{port}.sqlite3"),
+        "PROMETHEUS_MULTIPROC_DIR": os.path.join(tmpdir, f"metrics-{port}"),
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_THREADS": str(threads),
+    })
+    env.pop("GOOGLE_API_KEY", None)
+    if provider == "google":
+        env["GOOGLE_API_KEY"] = "bench"
+    env.update(extra_env)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "indian_hospital_finder:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_for(base_url + "/")
+    except RuntimeError:
+        proc.terminate()
+        raise
+    return proc, base_url
+
+
+def _wait_for(url, attempts=100):
+    for _ in range(attempts):
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up; start it by hand to see the error")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current, previous, tolerance):
+    """Regressions of p95 latency or throughput beyond `tolerance` (fraction) for matching runs."""
+    if current["provider"] != previous["provider"] or current["load"] != previous["load"]:
+        print("note: provider or load settings differ from the compared run")
+    prev_runs = {(r["workers"], r["threads"]): r for r in previous["runs"]}
+    problems = []
+    for run in current["runs"]:
+        prev = prev_runs.get((run["workers"], run["threads"]))
+        if prev is None:
+            continue
+        for name, stats in run["endpoints"].items():
+            before = prev["endpoints"].get(name)
+            if not before or not stats["requests"] or not before["requests"]:
+                continue
+            label = f"w{run['workers']}xt{run['threads']} {name}"
+            if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                problems.append(f"{label}: p95 {before['p95_ms']} -> {stats['p95_ms']} ms")
+            if stats["rps"] < before["rps"] * (1 - tolerance):
+                problems.append(f"{label}: throughput {before['rps']} -> {stats['rps']} req/s")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app against mock upstreams")
+    parser.add_argument("--provider", choices=("osm", "google"), default="osm")
+    parser.add_argument("--workers", default="1,2", help="comma-separated gunicorn worker counts")
+    parser.add_argument("--threads", default="1,4", help="comma-separated gunicorn thread counts")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent simulated clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per configuration")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--spread-deg", type=float, default=0.15, help="how far users are scattered around city centers")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="mock upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--density", type=float, default=0.5, help="mock facilities per km²")
+    parser.add_argument("--env", action="append", default=[], help="extra app env, KEY=VALUE (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=os.path.join(HERE, "results"))
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change before flagging")
+    args = parser.parse_args()
+
+    extra_env = dict(kv.split("=", 1) for kv in args.env)
+    # the mocks get their own process so their CPU work doesn't skew client-side timings
+    mock_port = _free_port()
+    mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_upstreams.py"), "--port", str(mock_port),
+                             "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                             "--error-rate", str(args.error_rate), "--density", str(args.density)],
+                            stdout=subprocess.DEVNULL)
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    _wait_for(mock_url + "/health")
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "provider": args.provider,
+        "mock": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "density": args.density},
+        "load": {"concurrency": args.concurrency, "duration": args.duration, "spread_deg": args.spread_deg, "seed": args.seed, "env": extra_env},
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for workers in (int(w) for w in args.workers.split(",")):
+            for threads in (int(t) for t in args.threads.split(",")):
+                proc, base_url = _start_app(mock_url, args.provider, workers, threads, extra_env, tmpdir)
+                try:
+                    report = LoadGenerator(base_url, args.concurrency, args.spread_deg, args.seed).run(args.duration, args.warmup)
+                finally:
+                    proc.terminate()
+                    proc.wait(timeout=30)
+                total = round(sum(r["rps"] for r in report.values()), 2)
+                result["runs"].append({"workers": workers, "threads": threads, "total_rps": total, "endpoints": report})
+                print(f"workers={workers} threads={threads} total={total} req/s")
+                for name, r in report.items():
+                    print(f"  {name:14s} {r['rps']:8.1f} req/s  p50={r['p50_ms']} p95={r['p95_ms']} p99={r['p99_ms']} ms  errors={r['errors']}")
+    mock.terminate()
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(args.out, f"{stamp}-{result['git_commit']}-{args.provider}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for p in problems:
+            print("REGRESSION", p)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# gunicorn -c gunicorn.conf.py indian_hospital_finder:app
+import os
+import tempfile
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# import the app once in the master and fork workers from it: the facility index, gazetteer
+# mmap and rendered assets are shared copy-on-write, and the caches live in the shared
+# SQLite file (CACHE_PATH), so extra workers add throughput rather than cache memory
+preload_app = os.environ.get("PRELOAD_APP", "1") == "1"
+
+# WORKER_MODE=async serves requests from gevent workers: each worker runs an event loop and
+# every upstream call (requests, locks, executor pools) yields to it while it waits, so one
+# process holds WORKER_CONNECTIONS in-flight requests instead of `threads`. sqlite3 is not
+# patched by gevent, so the shared cache runs its queries on gevent's native threadpool.
+# Upstream fan-outs (batch search/details, prefetch) run their executor tasks as greenlets.
+if os.environ.get("WORKER_MODE") == "async":
+    # patch before the app (and its locks, pools and sessions) is imported, also with preload_app
+    from gevent import monkey
+    monkey.patch_all()
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+else:
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# metrics from all workers are aggregated through files in this directory (see /metrics).
+# It must exist before the app is imported, which with preload_app happens in the master
+# right after this file is read, so it is prepared here rather than in a server hook.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "hospital_finder_metrics"))
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _clear_stale_metrics(path):
+    # start every deployment from empty counters, but only once per master (the config is
+    # re-read on HUP) and never the files of live processes: the preloaded master's own, or
+    # the old master's workers during a USR2 upgrade. Files are named <kind>_<pid>.db.
+    if os.environ.get("HOSPITAL_FINDER_METRICS_MASTER") == str(os.getpid()):
+        return
+    os.environ["HOSPITAL_FINDER_METRICS_MASTER"] = str(os.getpid())
+    for name in os.listdir(path):
+        pid = name.rsplit("_", 1)[-1].split(".", 1)[0]
+        if not (pid.isdigit() and _pid_alive(int(pid))):
+            os.remove(os.path.join(path, name))
+
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+_clear_stale_metrics(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,9 +1,32 @@
 # app.py
 import os
+import codecs
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import random
+import re
+import shutil
+import sqlite3
+import threading
+import click
+import csv
+import mmap
+import struct
+import sys
+import zlib
+import numpy as np
 import requests
-from flask import Flask, render_template_string, request, jsonify
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from flask import Flask, Response, render_template, request, jsonify, abort, g, has_request_context, stream_with_context
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
 import time
 
 app = Flask(__name__)
@@ -11,293 +34,2043 @@ app = Flask(__name__)
 # config from env
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")  # optional; best experience if provided
 MAP_PROVIDER = "google" if GOOGLE_API_KEY else "osm"  # auto-fallback to OSM if no key
+# OSM facility source (in OSM mode, and for mode=knn always): "overpass" queries the live API,
+# "local" answers from the offline index
+FACILITY_SOURCE = os.environ.get("FACILITY_SOURCE", "overpass")
+FACILITY_INDEX_PATH = os.environ.get("FACILITY_INDEX_PATH", "facilities.json")
+# cache shared by all worker processes (SQLite, WAL mode) behind small per-process LRUs
+CACHE_PATH = os.environ.get("CACHE_PATH", "cache.sqlite3")
+CACHE_MAX_BYTES = int(float(os.environ.get("CACHE_MAX_MB", 256)) * 1024 * 1024)
+# geocode cache sizes and TTLs in seconds
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", 2048))
+GEOCODE_TTL = {
+    "google": int(os.environ.get("GEOCODE_TTL_GOOGLE", 30 * 86400)),
+    "osm": int(os.environ.get("GEOCODE_TTL_OSM", 90 * 86400)),
+}
+GEOCODE_NEGATIVE_TTL = int(os.environ.get("GEOCODE_NEGATIVE_TTL", 86400))
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 4))
+# upstream HTTP client: timeouts in seconds, retries are per call on top of the first attempt
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+UPSTREAM_RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 2))
+UPSTREAM_BACKOFF = float(os.environ.get("UPSTREAM_BACKOFF", 0.25))
+# keep-alive connections per host; at least the largest per-provider concurrency cap, or
+# async workers open (and throw away) extra connections above it
+UPSTREAM_POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", 16))
+# mirror routing: EWMA smoothing, hedge delay bounds (seconds) and circuit breaker settings
+UPSTREAM_EWMA_ALPHA = float(os.environ.get("UPSTREAM_EWMA_ALPHA", 0.2))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 0.25))
+HEDGE_MAX_DELAY = float(os.environ.get("HEDGE_MAX_DELAY", 5.0))
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", 3))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 30))
+# how long Google stays switched off (OSM serves instead) after a quota or billing error
+GOOGLE_FALLBACK_COOLDOWN = float(os.environ.get("GOOGLE_FALLBACK_COOLDOWN", 300))
 
-# HTML template: 2-column layout, left controls, right map
-# Google Maps JS will be used if GOOGLE_API_KEY provided; otherwise use Leaflet + OSM tiles
-TEMPLATE = """
-<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <title>India Hospital Finder</title>
-  <meta name="viewport" content="width=device-width,initial-scale=1">
-  <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.1/dist/css/bootstrap.min.css" rel="stylesheet">
-  {% if map_provider == 'osm' %}
-  <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.3/dist/leaflet.css"/>
-  {% endif %}
-  <style>
-    body { background:#f8f9fa; }
-    #map { height: 80vh; width:100%; border-radius:6px; }
-    .result-item { cursor:pointer; }
-  </style>
-</head>
-<body>
-<div class="container-fluid py-3">
-  <h2 class="mb-3 text-center">India Hospital Finder — Professional</h2>
-  <div class="row g-3">
-    <div class="col-md-4">
-      <div class="card p-3 shadow-sm">
-        <form id="searchForm">
-          <div class="mb-2">
-            <label class="form-label">Location (auto-suggest)</label>
-            <input id="locationInput" class="form-control" placeholder="Type a city, landmark or address" autocomplete="off">
-          </div>
-          <div class="mb-2">
-            <label class="form-label">Manual location (lat,lng) — optional</label>
-            <input id="manualLocation" class="form-control" placeholder="12.97,77.59 or leave empty">
-          </div>
-          <div class="mb-2">
-            <label class="form-label">Type</label>
-            <select id="typeSelect" class="form-select">
-              <option value="hospital">Hospital</option>
-              <option value="clinic">Clinic</option>
-              <option value="pharmacy">Pharmacy</option>
-              <option value="mental_health">Mental Health</option>
-              <option value="all">All</option>
-            </select>
-          </div>
-          <div class="d-grid gap-2">
-            <button class="btn btn-primary" type="submit">Search Nearby</button>
-          </div>
-        </form>
-
-        <hr>
-        <h6>Results</h6>
-        <div id="results" style="max-height:50vh; overflow:auto;"></div>
-      </div>
-    </div>
-
-    <div class="col-md-8">
-      <div class="card p-2 shadow-sm">
-        <div id="map"></div>
-        <div id="detailCard" class="mt-3"></div>
-      </div>
-    </div>
-  </div>
-</div>
-
-<!-- dependencies -->
-<script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.1/dist/js/bootstrap.bundle.min.js"></script>
-
-{% if map_provider == 'google' %}
-<script src="https://maps.googleapis.com/maps/api/js?key={{ google_api_key }}&libraries=places"></script>
-<script>
-  // Google Maps version
-  let map, service, infoWindow, userMarker;
-  function initMap() {
-    map = new google.maps.Map(document.getElementById("map"), { center: { lat: 20.5937, lng: 78.9629 }, zoom: 5 });
-    infoWindow = new google.maps.InfoWindow();
-    // Autocomplete for location input
-    const input = document.getElementById('locationInput');
-    const autocomplete = new google.maps.places.Autocomplete(input, { componentRestrictions: { country: "in" }});
-    autocomplete.setFields(["geometry","formatted_address","name"]);
-    autocomplete.addListener('place_changed', () => {
-      const place = autocomplete.getPlace();
-      if (!place.geometry) return;
-      const loc = place.geometry.location;
-      map.setCenter(loc);
-      map.setZoom(13);
-    });
-  }
-
-  window.initMap = initMap; // for callback if needed
-
-  // helpers: perform search via our backend
-  async function searchNearby(lat,lng,type){
-    const r = await fetch('/api/search_nearby', {
-      method:'POST',
-      headers:{'Content-Type':'application/json'},
-      body: JSON.stringify({ lat, lng, type })
-    });
-    return r.json();
-  }
-
-  // on submit
-  document.getElementById('searchForm').addEventListener('submit', async (e)=>{
-    e.preventDefault();
-    const manual = document.getElementById('manualLocation').value.trim();
-    let lat,lng;
-    if(manual){
-      const parts = manual.split(',');
-      if(parts.length>=2){ lat = parseFloat(parts[0]); lng = parseFloat(parts[1]); }
-    }
-    if(!lat){
-      const v = document.getElementById('locationInput').value.trim();
-      if(!v){ alert('Enter location or manual coords'); return; }
-      // geocode via backend
-      const resp = await fetch('/api/geocode', {
-        method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ q: v })
-      });
-      const j = await resp.json();
-      if(!j.ok){ alert('Location not found'); return; }
-      lat = j.lat; lng = j.lng;
-    }
-    const type = document.getElementById('typeSelect').value;
-    const json = await searchNearby(lat,lng,type);
-    renderResults(json, lat, lng);
-  });
-
-  let markers = [];
-  function clearMarkers(){ markers.forEach(m=>m.setMap(null)); markers = []; }
-
-  function renderResults(json, userLat, userLng){
-    const resultsDiv = document.getElementById('results'); resultsDiv.innerHTML = '';
-    clearMarkers();
-    if(!json.results || json.results.length === 0){ resultsDiv.innerHTML = '<p>No results nearby.</p>'; return; }
-    json.results.forEach((place, idx)=>{
-      const item = document.createElement('div'); item.className='p-2 result-item border-bottom';
-      item.innerHTML = `<b>${place.name}</b><br><small>${place.address||''}</small><br><small>Rating: ${place.rating||'N/A'}</small>`;
-      item.onclick = ()=> { showDetails(place); }
-      resultsDiv.appendChild(item);
-
-      // place marker
-      const marker = new google.maps.Marker({
-        position: { lat: place.lat, lng: place.lng },
-        map,
-        title: place.name
-      });
-      marker.addListener('click', ()=> showDetails(place));
-      markers.push(marker);
-    });
-    map.setCenter({ lat: userLat, lng: userLng }); map.setZoom(13);
-  }
-
-  async function showDetails(place){
-    const r = await fetch('/api/place_details', {
-      method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ place_id: place.place_id })
-    });
-    const j = await r.json();
-    const html = `
-      <div class="card p-3">
-        <h5>${j.name}</h5>
-        <p>${j.address||''}</p>
-        <p>Phone: ${j.phone||'N/A'}</p>
-        <p>Website: ${j.website ? '<a href="'+j.website+'" target="_blank">'+j.website+'</a>' : 'N/A'}</p>
-        <p>Rating: ${j.rating||'N/A'}</p>
-        <div>
-          <button class="btn btn-sm btn-outline-primary" onclick="getDirections(${j.lat},${j.lng})">Get Directions</button>
-        </div>
-      </div>
-    `;
-    document.getElementById('detailCard').innerHTML = html;
-  }
-
-  async function getDirections(destLat, destLng){
-    // get user's location (we used last searched center)
-    const resp = await fetch('/api/directions', {
-      method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ dest: { lat: destLat, lng: destLng } })
-    });
-    const j = await resp.json();
-    if(!j.ok){ alert('Directions error'); return; }
-    // open google maps with directions
-    const url = j.google_maps_url || j.navigation_url || ('https://www.google.com/maps/dir/?api=1&destination='+destLat+','+destLng);
-    window.open(url, '_blank');
-  }
-
-  // initialize map after script loads
-  window.addEventListener('load', ()=> {
-    // if initMap not automatically called, call it
-    if(typeof google !== 'undefined' && google.maps && !map) initMap();
-  });
-</script>
-
-{% else %}
-<!-- OSM / Leaflet JS version (fallback) -->
-<script src="https://unpkg.com/leaflet@1.9.3/dist/leaflet.js"></script>
-<script>
-  let map = L.map('map').setView([20.5937,78.9629],5);
-  L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',{ attribution:'© OpenStreetMap contributors' }).addTo(map);
-  let markers = [];
-
-  async function searchNearby(lat,lng,type){
-    const r = await fetch('/api/search_nearby', {
-      method:'POST',
-      headers:{'Content-Type':'application/json'},
-      body: JSON.stringify({ lat, lng, type })
-    });
-    return r.json();
-  }
-
-  document.getElementById('searchForm').addEventListener('submit', async (e)=>{
-    e.preventDefault();
-    const manual = document.getElementById('manualLocation').value.trim();
-    let lat,lng;
-    if(manual){
-      const parts = manual.split(',');
-      if(parts.length>=2){ lat = parseFloat(parts[0]); lng = parseFloat(parts[1]); }
-    }
-    if(!lat){
-      const v = document.getElementById('locationInput').value.trim();
-      if(!v){ alert('Enter location or manual coords'); return; }
-      const resp = await fetch('/api/geocode', {
-        method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ q: v })
-      });
-      const j = await resp.json();
-      if(!j.ok){ alert('Location not found'); return; }
-      lat = j.lat; lng = j.lng;
+# upstream base URLs (overridable, e.g. to point at bench/mock_upstreams.py)
+GOOGLE_MAPS_API = os.environ.get("GOOGLE_MAPS_API", "https://maps.googleapis.com/maps/api")
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+# interchangeable Overpass instances (comma-separated); an explicit OVERPASS_URL alone means no mirrors
+OVERPASS_URLS = [u.strip() for u in os.environ.get("OVERPASS_URLS", "").split(",") if u.strip()] or (
+    [OVERPASS_URL] if "OVERPASS_URL" in os.environ else [OVERPASS_URL, "https://overpass.kumi.systems/api/interpreter"])
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+USER_AGENT = "india_hospital_finder"
+# nearby search: results are cached per grid tile (SEARCH_TILE_DEG degrees square) and type
+SEARCH_RADIUS_M = int(os.environ.get("SEARCH_RADIUS_M", 20000))
+SEARCH_TILE_DEG = float(os.environ.get("SEARCH_TILE_DEG", 0.02))
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", 600))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 512))  # per process; the shared cache holds the rest
+SEARCH_DEFAULT_LIMIT = int(os.environ.get("SEARCH_DEFAULT_LIMIT", 25))
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", 100))
+# /api/search_nearby_batch: points per request, worker threads, tiles merged per Overpass query
+BATCH_MAX_POINTS = int(os.environ.get("BATCH_MAX_POINTS", 500))
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 8))
+OVERPASS_BATCH_TILES = int(os.environ.get("OVERPASS_BATCH_TILES", 16))
+# mode=knn: rings start at KNN_START_RADIUS_M and grow by KNN_GROWTH up to KNN_MAX_RADIUS_M
+KNN_START_RADIUS_M = int(os.environ.get("KNN_START_RADIUS_M", 1000))
+KNN_GROWTH = float(os.environ.get("KNN_GROWTH", 2.0))
+KNN_MAX_RADIUS_M = int(os.environ.get("KNN_MAX_RADIUS_M", 50000))
+# mode=emergency: k nearest facilities per type precomputed per grid cell by `flask build-emergency-grid`
+EMERGENCY_GRID_PATH = os.environ.get("EMERGENCY_GRID_PATH", "emergency_grid")
+EMERGENCY_GRID_DEG = float(os.environ.get("EMERGENCY_GRID_DEG", 0.1))
+EMERGENCY_GRID_K = int(os.environ.get("EMERGENCY_GRID_K", 8))
+# offline gazetteer (cities, districts, localities, PIN codes) compiled by `flask build-gazetteer`
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", "gazetteer.idx")
+AUTOCOMPLETE_LIMIT = int(os.environ.get("AUTOCOMPLETE_LIMIT", 8))
+# road graph for /api/eta_matrix compiled by `flask build-road-graph`; snap distance in meters
+ROAD_GRAPH_PATH = os.environ.get("ROAD_GRAPH_PATH", "roads.npz")
+ETA_MAX_TARGETS = int(os.environ.get("ETA_MAX_TARGETS", 100))
+ETA_MAX_SNAP_M = float(os.environ.get("ETA_MAX_SNAP_M", 1500))
+ETA_MAX_MINUTES = float(os.environ.get("ETA_MAX_MINUTES", 120))
+# place details: cached per place id; the top DETAILS_PREFETCH_COUNT search results are fetched ahead of clicks
+DETAILS_CACHE_SIZE = int(os.environ.get("DETAILS_CACHE_SIZE", 2048))
+DETAILS_CACHE_TTL = int(os.environ.get("DETAILS_CACHE_TTL", 86400))
+DETAILS_PREFETCH_COUNT = int(os.environ.get("DETAILS_PREFETCH_COUNT", 5))
+DETAILS_BATCH_MAX = int(os.environ.get("DETAILS_BATCH_MAX", 100))
+NOMINATIM_LOOKUP_MAX = 50  # ids per Nominatim /lookup call
+# index page: rendered once at startup (templates/index.html), browser/CDN cache lifetime in seconds
+INDEX_MAX_AGE = int(os.environ.get("INDEX_MAX_AGE", 300))
+# add a Server-Timing header (app total, upstream calls, parsing) to every response
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+try:
+    import brotli  # optional: adds br-encoded variants of the page and its scripts
+except ImportError:
+    brotli = None
+
+# -------------------------
+# Server-side helpers & endpoints
+# -------------------------
+
+# -------------------------
+# Metrics
+# -------------------------
+
+# Under gunicorn set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does) so every worker
+# writes its samples to shared files and /metrics aggregates across processes.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+HTTP_REQUESTS = Counter("hospital_finder_http_requests_total", "Requests by route, method and status", ["route", "method", "status"])
+HTTP_ERRORS = Counter("hospital_finder_http_errors_total", "5xx responses by route", ["route"])
+HTTP_LATENCY = Histogram("hospital_finder_http_request_duration_seconds", "Request latency by route", ["route"], buckets=LATENCY_BUCKETS)
+HTTP_QUEUE = Histogram("hospital_finder_http_queue_seconds", "Time from the router's X-Request-Start to a worker picking the request up", buckets=LATENCY_BUCKETS)
+UPSTREAM_LATENCY = Histogram("hospital_finder_upstream_request_duration_seconds", "Upstream call latency per attempt", ["provider"], buckets=LATENCY_BUCKETS)
+UPSTREAM_RESPONSES = Counter("hospital_finder_upstream_responses_total", "Upstream attempts by HTTP status (or timeout / connection_error)", ["provider", "status"])
+UPSTREAM_TIMEOUTS = Counter("hospital_finder_upstream_timeouts_total", "Upstream attempts that timed out", ["provider"])
+UPSTREAM_BYTES = Counter("hospital_finder_upstream_received_bytes_total", "Response bytes received from upstreams", ["provider"])
+PHASE_LATENCY = Histogram("hospital_finder_phase_duration_seconds", "In-process work such as upstream JSON parsing", ["phase"], buckets=LATENCY_BUCKETS)
+UPSTREAM_HEDGES = Counter("hospital_finder_upstream_hedges_total", "Duplicate requests sent to a second endpoint because the first was slow", ["provider"])
+UPSTREAM_FAILOVERS = Counter("hospital_finder_upstream_failovers_total", "Requests retried on another endpoint (or provider) after an error", ["provider"])
+BREAKER_OPENS = Counter("hospital_finder_circuit_breaker_opens_total", "Times an endpoint's circuit breaker opened", ["endpoint"])
+CACHE_LOOKUPS = Counter("hospital_finder_cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+
+def _record_timing(name, seconds):
+    if has_request_context():
+        timings = g.setdefault("timings", {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def timed(phase):
+    """Time a block of in-process work into PHASE_LATENCY and the Server-Timing header."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        PHASE_LATENCY.labels(phase).observe(dt)
+        _record_timing(phase, dt)
+
+@app.before_request
+def _start_request_timer():
+    g.start = time.perf_counter()
+    start = request.headers.get("X-Request-Start", "")  # e.g. "t=1700000000123" (ms) from the router
+    if start.lstrip("t=").isdigit():
+        HTTP_QUEUE.observe(max(0.0, time.time() - int(start.lstrip("t=")) / 1000.0))
+
+@app.after_request
+def _record_request(resp):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    elapsed = time.perf_counter() - g.get("start", time.perf_counter())
+    HTTP_REQUESTS.labels(route, request.method, str(resp.status_code)).inc()
+    HTTP_LATENCY.labels(route).observe(elapsed)
+    if resp.status_code >= 500:
+        HTTP_ERRORS.labels(route).inc()
+    if SERVER_TIMING:
+        parts = [f"app;dur={elapsed * 1000:.1f}"]
+        parts += [f"{name};dur={secs * 1000:.1f}" for name, secs in g.get("timings", {}).items()]
+        resp.headers["Server-Timing"] = ", ".join(parts)
+    return resp
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        body = generate_latest(registry)
+    else:
+        body = generate_latest()
+    return app.response_class(body, mimetype=CONTENT_TYPE_LATEST)
+
+# -------------------------
+# Upstream HTTP client
+# -------------------------
+
+# per-provider read timeout, overall deadline for a call including its retries, cap on
+# concurrent in-flight calls and minimum seconds between call starts (both per process);
+# override with UPSTREAM_READ_TIMEOUT_<NAME> / UPSTREAM_DEADLINE_<NAME> /
+# UPSTREAM_CONCURRENCY_<NAME> / UPSTREAM_MIN_INTERVAL_<NAME>
+UPSTREAM_PROVIDERS = {
+    "google_geocode": {"read_timeout": 10, "deadline": 20, "concurrency": 16, "min_interval": 0},
+    "google_places": {"read_timeout": 10, "deadline": 20, "concurrency": 16, "min_interval": 0},
+    "google_details": {"read_timeout": 10, "deadline": 20, "concurrency": 16, "min_interval": 0},
+    "overpass": {"read_timeout": 30, "deadline": 40, "concurrency": 4, "min_interval": 0},
+    # usage policy: at most 1 req/s. Paced per process, so with several workers (or hosts)
+    # divide it: UPSTREAM_MIN_INTERVAL_NOMINATIM = number of processes
+    "nominatim": {"read_timeout": 10, "deadline": 20, "concurrency": 1, "min_interval": 1.0},
+}
+for _name, _cfg in UPSTREAM_PROVIDERS.items():
+    _cfg["read_timeout"] = float(os.environ.get(f"UPSTREAM_READ_TIMEOUT_{_name.upper()}", _cfg["read_timeout"]))
+    _cfg["deadline"] = float(os.environ.get(f"UPSTREAM_DEADLINE_{_name.upper()}", _cfg["deadline"]))
+    _cfg["concurrency"] = int(os.environ.get(f"UPSTREAM_CONCURRENCY_{_name.upper()}", _cfg["concurrency"]))
+    _cfg["min_interval"] = float(os.environ.get(f"UPSTREAM_MIN_INTERVAL_{_name.upper()}", _cfg["min_interval"]))
+    _cfg["slots"] = {}  # per host, so every mirror gets its own cap
+    _cfg["next_start"] = {}  # per host, earliest start of the next call when paced
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class UpstreamError(Exception):
+    pass
+
+class UpstreamBusy(UpstreamError):
+    """Our own concurrency cap was hit; says nothing about the endpoint."""
+
+class GoogleQuotaError(UpstreamError):
+    """Google refused the call for quota or billing reasons."""
+
+GOOGLE_QUOTA_STATUSES = {"OVER_QUERY_LIMIT", "OVER_DAILY_LIMIT", "REQUEST_DENIED"}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _session(url):
+    """One keep-alive Session (and connection pool) per upstream host."""
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        sess = _sessions.get(host)
+        if sess is None:
+            sess = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=UPSTREAM_POOL_SIZE)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            sess.headers["User-Agent"] = USER_AGENT
+            _sessions[host] = sess
+    return sess
+
+def _record_upstream(provider, t0, status, nbytes=0):
+    dt = time.perf_counter() - t0
+    UPSTREAM_LATENCY.labels(provider).observe(dt)
+    UPSTREAM_RESPONSES.labels(provider, status).inc()
+    UPSTREAM_BYTES.labels(provider).inc(nbytes)
+    _record_timing(provider, dt)
+
+@contextmanager
+def _provider_slot(provider, url):
+    cfg = UPSTREAM_PROVIDERS[provider]
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        slots = cfg["slots"].setdefault(host, threading.BoundedSemaphore(cfg["concurrency"]))
+    if not slots.acquire(timeout=cfg["read_timeout"]):
+        raise UpstreamBusy(f"{provider}: too many concurrent upstream calls")
+    try:
+        yield cfg
+    finally:
+        slots.release()
+
+def _pace(provider, cfg, url, deadline):
+    # reserve the next start slot for this host and wait for it
+    if not cfg["min_interval"]:
+        return
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        start = max(time.monotonic(), cfg["next_start"].get(host, 0.0))
+        if start >= deadline:
+            raise UpstreamBusy(f"{provider}: rate limited")
+        cfg["next_start"][host] = start + cfg["min_interval"]
+    time.sleep(max(0.0, start - time.monotonic()))
+
+def _retry_after(r):
+    # seconds asked for by a Retry-After header (delta-seconds or an HTTP date), or 0
+    value = r.headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+def _request(provider, cfg, method, url, **kwargs):
+    deadline = time.monotonic() + cfg["deadline"]
+    if "timeout" in kwargs:
+        # a caller asking for a longer timeout (bulk downloads) gets a deadline to match
+        connect_timeout, read_timeout = kwargs.pop("timeout")
+        deadline = max(deadline, time.monotonic() + connect_timeout + read_timeout)
+    else:
+        connect_timeout, read_timeout = UPSTREAM_CONNECT_TIMEOUT, cfg["read_timeout"]
+    stream = kwargs.get("stream", False)
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        last = attempt == UPSTREAM_RETRIES
+        delay = random.uniform(0, UPSTREAM_BACKOFF * 2 ** attempt)
+        _pace(provider, cfg, url, deadline)
+        remaining = deadline - time.monotonic()
+        t0 = time.perf_counter()
+        try:
+            r = _session(url).request(method, url, timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            timeout = isinstance(e, requests.Timeout)
+            _record_upstream(provider, t0, "timeout" if timeout else "connection_error")
+            if timeout:
+                UPSTREAM_TIMEOUTS.labels(provider).inc()
+            # a POST that timed out reading is a query the server is still chewing on
+            # (Overpass); sending it again would most likely just time out again
+            slow_post = method == "POST" and isinstance(e, requests.ReadTimeout)
+            if last or slow_post or time.monotonic() + delay >= deadline:
+                raise
+        else:
+            # streamed bodies are counted by whoever reads them
+            _record_upstream(provider, t0, str(r.status_code), 0 if stream else len(r.content))
+            if r.status_code in (429, 503):
+                delay = max(delay, _retry_after(r))
+            if last or r.status_code not in RETRY_STATUSES or time.monotonic() + delay >= deadline:
+                return r
+            r.close()
+        time.sleep(delay)
+
+def upstream(provider, method, url, **kwargs):
+    """
+    Make an upstream call through the shared pooled sessions.
+    Bounded by the provider's timeouts, deadline and concurrency cap; connection errors,
+    timeouts (except read timeouts of a POST) and RETRY_STATUSES are retried with
+    full-jitter exponential backoff, or after Retry-After, while the deadline allows.
+    """
+    with _provider_slot(provider, url) as cfg:
+        return _request(provider, cfg, method, url, **kwargs)
+
+@contextmanager
+def upstream_stream(provider, method, url, **kwargs):
+    """
+    upstream() with stream=True: yields the response before its body is read.
+    The provider slot and the pooled connection are held until the block exits.
+    """
+    with _provider_slot(provider, url) as cfg:
+        r = _request(provider, cfg, method, url, stream=True, **kwargs)
+        try:
+            yield r
+        finally:
+            r.close()
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failures. Once `cooldown` seconds have passed calls
+    are let through again: a success closes it, another failure reopens it right away.
+    """
+
+    def __init__(self, name, failures, cooldown):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self._failed = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        return self._failed < self.failures or time.time() >= self._open_until
+
+    def success(self):
+        self._failed = 0
+
+    def failure(self):
+        with self._lock:
+            self._failed += 1
+            if self._failed >= self.failures and time.time() >= self._open_until:
+                self._open_until = time.time() + self.cooldown
+                BREAKER_OPENS.labels(self.name).inc()
+
+    def state(self):
+        if self._failed < self.failures:
+            return "closed"
+        return "half_open" if time.time() >= self._open_until else "open"
+
+def _endpoint_fault(e):
+    # a 4xx (other than 429) means our request was bad, which another mirror won't fix
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return not isinstance(e, UpstreamBusy) and (status is None or status >= 500 or status == 429)
+
+class Endpoint:
+    """One interchangeable upstream URL: EWMA latency and error rate, recent latencies and a breaker."""
+
+    def __init__(self, url):
+        self.url = url
+        self.host = urlparse(url).netloc
+        self.latency = None  # EWMA seconds of successful calls
+        self.error_rate = 0.0
+        self.recent = deque(maxlen=200)
+        self.breaker = CircuitBreaker(self.host, BREAKER_FAILURES, BREAKER_COOLDOWN)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        a = UPSTREAM_EWMA_ALPHA
+        with self._lock:
+            self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+            if ok:
+                self.latency = seconds if self.latency is None else (1 - a) * self.latency + a * seconds
+                self.recent.append(seconds)
+        if ok:
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+
+    def score(self):
+        # expected time to a good answer; unmeasured endpoints sort first so they get sampled
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(0.05, 1.0 - self.error_rate)
+
+    def p95(self):
+        with self._lock:
+            recent = sorted(self.recent)
+        return recent[int(len(recent) * 0.95)] if len(recent) >= 20 else None
+
+    def stats(self):
+        return {"url": self.url, "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 4), "p95_ms": round(self.p95() * 1000, 1) if self.p95() else None,
+                "breaker": self.breaker.state()}
+
+hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+class EndpointPool:
+    """
+    Latency-aware routing over interchangeable endpoints. call() sends the request to the
+    best endpoint, hedges it onto the next one if no answer came within the first one's p95,
+    fails over on errors and returns the first good answer.
+    """
+
+    def __init__(self, name, urls):
+        self.name = name
+        self.endpoints = [Endpoint(u) for u in urls]
+
+    def ranked(self):
+        """Endpoints whose breaker allows calls, best first; if every breaker is open, all of them."""
+        allowed = [e for e in self.endpoints if e.breaker.allow()]
+        return sorted(allowed or self.endpoints, key=Endpoint.score)
+
+    def hedge_delay(self, endpoint):
+        p95 = endpoint.p95()
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p95)) if p95 is not None else HEDGE_MAX_DELAY
+
+    def _timed(self, endpoint, fn):
+        t0 = time.perf_counter()
+        try:
+            result = fn(endpoint.url)
+        except Exception as e:
+            if _endpoint_fault(e):
+                endpoint.record(time.perf_counter() - t0, False)
+            raise
+        endpoint.record(time.perf_counter() - t0, True)
+        return result
+
+    def call(self, fn):
+        """First successful fn(url) across the pool; raises the last error if every endpoint failed."""
+        candidates = self.ranked()
+        delay = self.hedge_delay(candidates[0])
+        pending, error = {}, None
+
+        def launch():
+            endpoint = candidates.pop(0)
+            pending[hedge_pool.submit(self._timed, endpoint, fn)] = endpoint
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=delay if candidates else None, return_when=FIRST_COMPLETED)
+            if not done:
+                UPSTREAM_HEDGES.labels(self.name).inc()
+                launch()
+                continue
+            for fut in done:
+                pending.pop(fut)
+                try:
+                    return fut.result()  # slower duplicates finish in the background and only update stats
+                except Exception as e:
+                    error = e
+                    if not _endpoint_fault(e):
+                        raise
+            if candidates:
+                UPSTREAM_FAILOVERS.labels(self.name).inc()
+                launch()
+        raise error
+
+overpass_pool = EndpointPool("overpass", OVERPASS_URLS)
+google_breaker = CircuitBreaker("google", 1, GOOGLE_FALLBACK_COOLDOWN)
+
+def use_google():
+    """Google when a key is configured, unless a recent quota/billing error switched it to OSM."""
+    return bool(GOOGLE_API_KEY) and google_breaker.allow()
+
+def _google_status(provider, j):
+    """Raise for a Google error status; quota and billing errors also trip google_breaker."""
+    status = j.get("status")
+    if status in GOOGLE_QUOTA_STATUSES:
+        google_breaker.failure()
+        raise GoogleQuotaError(f"{provider}: {status} {j.get('error_message', '')}".strip())
+    if status not in ("OK", "ZERO_RESULTS", "NOT_FOUND"):
+        raise UpstreamError(f"{provider}: {status} {j.get('error_message', '')}".strip())
+    google_breaker.success()
+
+EARTH_RADIUS_M = 6371008.8
+OSM_AMENITIES = ("hospital", "clinic", "pharmacy")
+OSM_TYPES = ("node", "way", "relation")
+# search type -> OSM amenity values; mental_health additionally needs healthcare:speciality=psychiatry
+TYPE_AMENITIES = {
+    "hospital": ("hospital",),
+    "clinic": ("clinic",),
+    "pharmacy": ("pharmacy",),
+    "mental_health": ("hospital", "clinic"),
+    "all": OSM_AMENITIES,
+}
+
+def haversine_m_np(lat, lng, lats, lngs):
+    """Vectorized haversine: distances in meters from (lat, lng) to each of lats/lngs."""
+    p1 = np.radians(lat); p2 = np.radians(lats)
+    dp = p2 - p1; dl = np.radians(np.asarray(lngs) - lng)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+def rank_by_distance(lat, lng, places, max_radius_m):
+    """Copies of places within max_radius_m of (lat, lng), nearest first, with distance_km set."""
+    if not places:
+        return []
+    coords = np.array([(p["lat"], p["lng"]) for p in places], dtype=np.float64)
+    d = haversine_m_np(lat, lng, coords[:, 0], coords[:, 1])
+    order = np.argsort(d, kind="stable")
+    order = order[d[order] <= max_radius_m]
+    return [dict(places[i], distance_km=round(float(d[i]) / 1000, 3)) for i in order]
+
+def _is_mental_health(speciality):
+    return bool(speciality) and "psychiatry" in speciality
+
+def _osm_place_id(osm_type, osm_id):
+    """Nominatim-style id, e.g. N123 / W456 / R789."""
+    return f"{osm_type[0].upper()}{osm_id}" if osm_type and osm_id is not None else None
+
+def _osm_result(el):
+    """Normalize an Overpass element into the result shape returned by /api/search_nearby."""
+    tags = el.get("tags", {})
+    if el.get("type") == "node":
+        el_lat = el.get("lat"); el_lon = el.get("lon")
+    else:
+        center = el.get("center", {})
+        el_lat = center.get("lat"); el_lon = center.get("lon")
+    name = tags.get("name") or tags.get("operator") or "Unknown"
+    addr = ", ".join(v for k,v in tags.items() if k.startswith("addr:") ) or None
+    return {
+        "name": name,
+        "address": addr,
+        "lat": el_lat,
+        "lng": el_lon,
+        "rating": None,
+        "osm_id": el.get("id"),
+        "place_id": _osm_place_id(el.get("type"), el.get("id")),
     }
-    const type = document.getElementById('typeSelect').value;
-    const json = await searchNearby(lat,lng,type);
-    renderResults(json, lat, lng);
-  });
-
-  function clearMarkers(){ markers.forEach(m=>map.removeLayer(m)); markers=[]; }
-
-  function renderResults(json,userLat,userLng){
-    const resultsDiv = document.getElementById('results'); resultsDiv.innerHTML = '';
-    clearMarkers();
-    if(!json.results || json.results.length == 0){ resultsDiv.innerHTML = '<p>No results nearby.</p>'; return; }
-    json.results.forEach((place, idx)=>{
-      const item = document.createElement('div'); item.className='p-2 result-item border-bottom';
-      item.innerHTML = `<b>${place.name}</b><br><small>${place.address||''}</small><br><small>Rating: ${place.rating||'N/A'}</small>`;
-      item.onclick = ()=> { showDetails(place); }
-      resultsDiv.appendChild(item);
-
-      const marker = L.marker([place.lat, place.lng]).addTo(map).bindPopup(place.name);
-      markers.push(marker);
-    });
-    map.setView([userLat,userLng],13);
-  }
-
-  async function showDetails(place){
-    const r = await fetch('/api/place_details', {
-      method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ place_id: place.osm_id })
-    });
-    const j = await r.json();
-    const html = `
-      <div class="card p-3">
-        <h5>${j.name}</h5>
-        <p>${j.address||''}</p>
-        <p>Phone: ${j.phone||'N/A'}</p>
-        <p>Website: ${j.website ? '<a href="'+j.website+'" target="_blank">'+j.website+'</a>' : 'N/A'}</p>
-        <div>
-          <button class="btn btn-sm btn-outline-primary" onclick="window.open('https://www.openstreetmap.org/?mlat=${j.lat}&mlon=${j.lng}#map=18/${j.lat}/${j.lng}','_blank')">Open in OSM</button>
-        </div>
-      </div>
-    `;
-    document.getElementById('detailCard').innerHTML = html;
-  }
-
-  async function getDirections(destLat,destLng){
-    // open OSM directions site or fallback to Google Maps
-    const url = `https://www.openstreetmap.org/directions?to=${destLat}%2C${destLng}`;
-    window.open(url,'_blank');
-  }
-</script>
-{% endif %}
-</body>
-</html>
+
+# -------------------------
+# Offline facility index (OSM mode, FACILITY_SOURCE=local)
+# -------------------------
+
+# Overpass QL used by `flask refresh-facilities` when no dump file is given
+INDIA_FACILITIES_QUERY = """
+[out:json][timeout:900];
+area["ISO3166-1"="IN"][admin_level=2]->.india;
+nwr["amenity"~"^(hospital|clinic|pharmacy)$"](area.india);
+out center tags;
 """
 
+class FacilityIndex:
+    """
+    Grid-bucketed spatial index over OSM facilities.
+    Records are sorted by grid cell and stored column-wise (NumPy arrays for coordinates
+    and amenity codes), each cell maps to a contiguous [start, end) slice, so a radius
+    query only gathers the cells overlapping the search circle and ranks them in one pass.
+    """
+    CELL_DEG = 0.05  # ~5.5 km at the equator
+
+    def __init__(self, facilities):
+        cell = self.CELL_DEG
+        keyed = sorted(facilities, key=lambda f: (int(math.floor(f["lat"] / cell)), int(math.floor(f["lng"] / cell))))
+        self.lat = np.array([f["lat"] for f in keyed], dtype=np.float64)
+        self.lng = np.array([f["lng"] for f in keyed], dtype=np.float64)
+        self.osm_id = np.array([f["osm_id"] for f in keyed], dtype=np.int64)
+        self.amenity = np.array([OSM_AMENITIES.index(f["amenity"]) for f in keyed], dtype=np.uint8)
+        self.mental_health = np.array([_is_mental_health(f.get("speciality")) for f in keyed], dtype=bool)
+        self.osm_type = [f["osm_type"] for f in keyed]
+        self.speciality = [f.get("speciality") for f in keyed]
+        self.name = [f["name"] for f in keyed]
+        self.address = [f["address"] for f in keyed]
+        # one int64 per facility that survives rebuilds (row numbers don't): osm_id * 4 + type
+        self.key = self.osm_id * 4 + np.array([OSM_TYPES.index(t) for t in self.osm_type], dtype=np.int64)
+        self._key_order = np.argsort(self.key)
+        self._fingerprint = None
+        self.cells = {}
+        cy = np.floor(self.lat / cell).astype(np.int64)
+        cx = np.floor(self.lng / cell).astype(np.int64)
+        for i in range(len(keyed)):
+            key = (int(cy[i]), int(cx[i]))
+            start, _ = self.cells.get(key, (i, i))
+            self.cells[key] = (start, i + 1)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_overpass(cls, elements):
+        facilities = []
+        for el in elements:
+            tags = el.get("tags", {})
+            amenity = tags.get("amenity")
+            if amenity not in OSM_AMENITIES:
+                continue
+            res = _osm_result(el)
+            if res["lat"] is None or res["lng"] is None:
+                continue
+            facilities.append({
+                "osm_type": el.get("type"),
+                "osm_id": el.get("id"),
+                "amenity": amenity,
+                "name": res["name"],
+                "address": res["address"],
+                "lat": res["lat"],
+                "lng": res["lng"],
+                "speciality": tags.get("healthcare:speciality"),
+            })
+        return cls(facilities)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            rows = json.load(f)["facilities"]
+        keys = ("osm_type", "osm_id", "amenity", "lat", "lng", "name", "address", "speciality")
+        return cls([dict(zip(keys, row)) for row in rows])
+
+    def save(self, path):
+        rows = [[self.osm_type[i], int(self.osm_id[i]), OSM_AMENITIES[self.amenity[i]], float(self.lat[i]), float(self.lng[i]),
+                 self.name[i], self.address[i], self.speciality[i]]
+                for i in range(len(self))]
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"generated": int(time.time()), "facilities": rows}, f, separators=(",", ":"))
+        os.replace(tmp, path)  # atomic swap so running workers never read a half-written file
+
+    def result(self, i, distance_m=None):
+        res = {
+            "name": self.name[i],
+            "address": self.address[i],
+            "lat": float(self.lat[i]),
+            "lng": float(self.lng[i]),
+            "rating": None,
+            "osm_id": int(self.osm_id[i]),
+            "place_id": _osm_place_id(self.osm_type[i], int(self.osm_id[i])),
+        }
+        if distance_m is not None:
+            res["distance_km"] = round(float(distance_m) / 1000, 3)
+        return res
+
+    def fingerprint(self):
+        """Digest of the facility keys, positions and types, independent of row order."""
+        if self._fingerprint is None:
+            h = hashlib.sha1()
+            for column in (self.key, self.lat, self.lng, self.amenity, self.mental_health):
+                h.update(np.ascontiguousarray(column[self._key_order]).tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def rows(self, keys):
+        """Row indices of the facilities with these keys; keys no longer in the index are dropped."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.key, keys, sorter=self._key_order), len(self) - 1)
+        rows = self._key_order[pos]
+        return rows[self.key[rows] == keys]
+
+    def _mask(self, idx, typ):
+        amenities = TYPE_AMENITIES.get(typ, OSM_AMENITIES)
+        mask = np.isin(self.amenity[idx], [OSM_AMENITIES.index(a) for a in amenities])
+        if typ == "mental_health":
+            mask &= self.mental_health[idx]
+        return mask
+
+    def radius(self, lat, lng, radius_m, typ="all"):
+        """Return (distances_m, indices) of facilities of `typ` within radius_m, nearest first."""
+        cell = self.CELL_DEG
+        dlat = radius_m / 111320.0
+        dlng = radius_m / (111320.0 * max(0.01, math.cos(math.radians(lat))))
+        spans = []
+        for cy in range(int(math.floor((lat - dlat) / cell)), int(math.floor((lat + dlat) / cell)) + 1):
+            for cx in range(int(math.floor((lng - dlng) / cell)), int(math.floor((lng + dlng) / cell)) + 1):
+                span = self.cells.get((cy, cx))
+                if span:
+                    spans.append(np.arange(*span))
+        if not spans:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        idx = np.concatenate(spans)
+        idx = idx[self._mask(idx, typ)]
+        d = haversine_m_np(lat, lng, self.lat[idx], self.lng[idx])
+        keep = d <= radius_m
+        d, idx = d[keep], idx[keep]
+        order = np.argsort(d, kind="stable")
+        return d[order], idx[order]
+
+    def nearest(self, lat, lng, k, max_radius_m, typ="all"):
+        """k nearest within max_radius_m: grow the search circle until it holds k facilities."""
+        r = min(max_radius_m, self.CELL_DEG * 111320.0)
+        while True:
+            d, idx = self.radius(lat, lng, r, typ)
+            if len(idx) >= k or r >= max_radius_m:
+                return d[:k], idx[:k]
+            r = min(max_radius_m, r * 2)
+
+_facility_index = None
+_facility_index_mtime = None
+_facility_index_checked = 0.0
+_facility_index_lock = threading.Lock()
+
+def facility_index():
+    """Process-wide FacilityIndex, reloaded when `flask refresh-facilities` replaces the file."""
+    global _facility_index, _facility_index_mtime, _facility_index_checked
+    now = time.time()
+    if _facility_index is not None and now - _facility_index_checked < 30:
+        return _facility_index
+    with _facility_index_lock:
+        _facility_index_checked = now
+        mtime = os.path.getmtime(FACILITY_INDEX_PATH)
+        if _facility_index is None or mtime != _facility_index_mtime:
+            _facility_index = FacilityIndex.load(FACILITY_INDEX_PATH)
+            _facility_index_mtime = mtime
+    return _facility_index
+
+if FACILITY_SOURCE == "local" and os.path.exists(FACILITY_INDEX_PATH):
+    facility_index()  # load at startup rather than on the first search
+
+@app.cli.command("refresh-facilities")
+@click.argument("dump", required=False)
+def refresh_facilities(dump):
+    """Rebuild the offline facility index from an Overpass JSON dump (or a fresh India-wide query)."""
+    if dump:
+        with open(dump) as f:
+            data = json.load(f)
+    else:
+        r = upstream("overpass", "POST", overpass_pool.ranked()[0].url, data=INDIA_FACILITIES_QUERY, timeout=(UPSTREAM_CONNECT_TIMEOUT, 1000))
+        r.raise_for_status()
+        data = r.json()
+    index = FacilityIndex.from_overpass(data.get("elements", []))
+    index.save(FACILITY_INDEX_PATH)
+    click.echo(f"indexed {len(index)} facilities into {FACILITY_INDEX_PATH}")
+
+class EmergencyGrid:
+    """
+    Precomputed answers for mode=emergency. India's bounding box is rasterized into
+    cells of `deg` degrees. Each cell holds, per search type, the keys (FacilityIndex.key)
+    of the k facilities nearest its center within KNN_MAX_RADIUS_M (keys.npy, -1 padded)
+    and the distance to the k-th of them (kth.npy, inf when fewer were found). Both are
+    memory-mapped, so workers share one copy through the page cache and a lookup is one
+    array slice. snapshot.npz records the facilities the grid was built from, so
+    update() only recomputes the cells a facility change can affect, and meta.json their
+    fingerprint, so a grid is never consulted against a different facility set.
+    """
+    BBOX = (6.5, 68.0, 37.5, 97.5)  # south, west, north, east
+    TYPES = tuple(TYPE_AMENITIES)
+    BLOCK = 16  # cells per side of the blocks computed together
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.deg, self.k = meta["deg"], meta["k"]
+        self.south, self.west = meta["bbox"][:2]
+        self.facilities = meta.get("facilities")  # FacilityIndex.fingerprint() it was computed from
+        self.keys = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+        self.kth = np.load(os.path.join(path, "kth.npy"), mmap_mode="r")
+        self.ny, self.nx = self.kth.shape[:2]
+
+    @classmethod
+    def build(cls, index, path, deg, k):
+        """Compute every cell of a new grid into `path` (files are swapped in atomically)."""
+        south, west, north, east = cls.BBOX
+        ny, nx = int(math.ceil((north - south) / deg)), int(math.ceil((east - west) / deg))
+        os.makedirs(path, exist_ok=True)
+        keys = np.lib.format.open_memmap(os.path.join(path, "keys.npy.tmp"), mode="w+", dtype=np.int64, shape=(ny, nx, len(cls.TYPES), k))
+        kth = np.lib.format.open_memmap(os.path.join(path, "kth.npy.tmp"), mode="w+", dtype=np.float32, shape=(ny, nx, len(cls.TYPES)))
+        iy, ix = np.divmod(np.arange(ny * nx), nx)
+        for t, typ in enumerate(cls.TYPES):
+            keys_t, kth_t = _grid_nearest(index, typ, south + (iy + 0.5) * deg, west + (ix + 0.5) * deg, iy, ix, k)
+            keys[:, :, t] = keys_t.reshape(ny, nx, k)
+            kth[:, :, t] = kth_t.reshape(ny, nx)
+        keys.flush(); kth.flush()
+        del keys, kth
+        for name in ("keys.npy", "kth.npy"):
+            os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+        cls._finish(path, index, deg, k)
+        return ny * nx
+
+    def update(self, index):
+        """
+        Recompute only the cells a facility added, removed, moved or retyped since the last
+        build can affect. Workers have the arrays memory-mapped, so the changes are made to
+        copies that are swapped in afterwards. Returns the number of (cell, type) lists recomputed.
+        """
+        with np.load(os.path.join(self.path, "snapshot.npz")) as z:
+            old = set(zip(z["key"].tolist(), z["lat"].tolist(), z["lng"].tolist(), z["amenity"].tolist(), z["mental_health"].tolist()))
+        new = set(zip(index.key.tolist(), index.lat.tolist(), index.lng.tolist(), index.amenity.tolist(), index.mental_health.tolist()))
+        removed, added = old - new, new - old
+        iy, ix = np.divmod(np.arange(self.ny * self.nx), self.nx)
+        clat, clng = self.south + (iy + 0.5) * self.deg, self.west + (ix + 0.5) * self.deg
+        names = ("keys.npy", "kth.npy")
+        for name in names:
+            shutil.copyfile(os.path.join(self.path, name), os.path.join(self.path, name + ".tmp"))
+        keys = np.load(os.path.join(self.path, "keys.npy.tmp"), mmap_mode="r+")
+        kth = np.load(os.path.join(self.path, "kth.npy.tmp"), mmap_mode="r+")
+        recomputed = 0
+        for t, typ in enumerate(self.TYPES):
+            keys_t = keys[:, :, t].reshape(-1, self.k)
+            kth_t = kth[:, :, t].reshape(-1)
+            # a removed facility matters wherever it was listed, an added one wherever it is
+            # closer than the current k-th; a moved or retyped facility counts as both
+            gone = [f[0] for f in removed if _type_matches(typ, f[3], f[4])]
+            affected = np.isin(keys_t, gone).any(axis=1) if gone else np.zeros(len(kth_t), dtype=bool)
+            for key, lat, lng, amenity, mental_health in added:
+                if _type_matches(typ, amenity, mental_health):
+                    near = self._window(lat, lng)
+                    d = haversine_m_np(lat, lng, clat[near], clng[near])
+                    affected[near[(d < kth_t[near]) & (d <= KNN_MAX_RADIUS_M)]] = True
+            cells = np.nonzero(affected)[0]
+            if len(cells):
+                new_keys, new_kth = _grid_nearest(index, typ, clat[cells], clng[cells], iy[cells], ix[cells], self.k)
+                keys[iy[cells], ix[cells], t] = new_keys
+                kth[iy[cells], ix[cells], t] = new_kth
+                recomputed += len(cells)
+        keys.flush(); kth.flush()
+        del keys, kth
+        for name in names:
+            os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+        self._finish(self.path, index, self.deg, self.k)
+        return recomputed
+
+    def _window(self, lat, lng):
+        """Flat indices of the cells whose centers may be within KNN_MAX_RADIUS_M of (lat, lng)."""
+        dlat = KNN_MAX_RADIUS_M / 111320.0 + self.deg
+        dlng = KNN_MAX_RADIUS_M / (111320.0 * max(0.01, math.cos(math.radians(min(89.0, abs(lat) + dlat))))) + self.deg
+        y0, y1 = (int(math.floor((v - self.south) / self.deg)) for v in (lat - dlat, lat + dlat))
+        x0, x1 = (int(math.floor((v - self.west) / self.deg)) for v in (lng - dlng, lng + dlng))
+        ys, xs = np.meshgrid(np.arange(max(0, y0), min(self.ny, y1 + 1)), np.arange(max(0, x0), min(self.nx, x1 + 1)), indexing="ij")
+        return (ys * self.nx + xs).ravel()
+
+    @classmethod
+    def _finish(cls, path, index, deg, k):
+        tmp = os.path.join(path, "snapshot.npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, key=index.key, lat=index.lat, lng=index.lng, amenity=index.amenity, mental_health=index.mental_health)
+        os.replace(tmp, os.path.join(path, "snapshot.npz"))
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"deg": deg, "k": k, "bbox": list(cls.BBOX), "types": list(cls.TYPES),
+                       "facilities": index.fingerprint(), "generated": int(time.time())}, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))  # a new mtime tells workers to reopen (see emergency_grid)
+
+    def lookup(self, index, lat, lng, typ, k, max_radius_m=KNN_MAX_RADIUS_M):
+        """
+        (distances_m, rows) of up to k facilities nearest (lat, lng) within max_radius_m:
+        the lists of its cell and the 8 around it, re-ranked by exact distance. A cell's
+        list holds every facility closer to its center than its k-th, so that bounds how
+        far from the point the lists are complete; None when that doesn't cover the answer,
+        when the point is outside the grid or when `index` is not the facility set the grid
+        was computed from (the index reloads on its own after `flask refresh-facilities`).
+        """
+        if index.fingerprint() != self.facilities:
+            return None
+        iy = int(math.floor((lat - self.south) / self.deg))
+        ix = int(math.floor((lng - self.west) / self.deg))
+        if not (0 <= iy < self.ny and 0 <= ix < self.nx):
+            return None
+        window = (slice(max(0, iy - 1), iy + 2), slice(max(0, ix - 1), ix + 2), self.TYPES.index(typ))
+        cand = np.asarray(self.keys[window]).ravel()
+        rows = index.rows(np.unique(cand[cand >= 0]))
+        d = haversine_m_np(lat, lng, index.lat[rows], index.lng[rows])
+        order = np.argsort(d, kind="stable")
+        d, rows = d[order], rows[order]
+        cy, cx = np.meshgrid(np.arange(self.ny)[window[0]], np.arange(self.nx)[window[1]], indexing="ij")
+        to_center = haversine_m_np(lat, lng, self.south + (cy + 0.5) * self.deg, self.west + (cx + 0.5) * self.deg)
+        # every facility within `complete` of the point is in the lists
+        complete = float(np.max(np.minimum(self.kth[window], KNN_MAX_RADIUS_M) - to_center))
+        n = int(np.searchsorted(d, complete, side="right"))
+        if n < k and complete < max_radius_m:
+            return None
+        return d[:min(n, k)], rows[:min(n, k)]
+
+def _type_matches(typ, amenity, mental_health):
+    return OSM_AMENITIES[amenity] in TYPE_AMENITIES[typ] and (typ != "mental_health" or mental_health)
+
+def _grid_nearest(index, typ, clat, clng, iy, ix, k):
+    """
+    Keys of the k facilities of `typ` nearest each center (clat[i], clng[i]) within
+    KNN_MAX_RADIUS_M, and the k-th distance. Centers are handled in BLOCK x BLOCK blocks
+    of cells against only the facilities within reach of the block.
+    """
+    keys = np.full((len(clat), k), -1, dtype=np.int64)
+    kth = np.full(len(clat), np.inf, dtype=np.float32)
+    rows = np.nonzero(index._mask(np.arange(len(index)), typ))[0]
+    flat, flng, fkey = index.lat[rows], index.lng[rows], index.key[rows]
+    reach_lat = KNN_MAX_RADIUS_M / 111320.0
+    block = (iy // EmergencyGrid.BLOCK) * 100000 + ix // EmergencyGrid.BLOCK
+    order = np.argsort(block, kind="stable")
+    _, starts = np.unique(block[order], return_index=True)
+    for sel in np.split(order, starts[1:]):
+        lat_lo, lat_hi = clat[sel].min() - reach_lat, clat[sel].max() + reach_lat
+        reach_lng = KNN_MAX_RADIUS_M / (111320.0 * max(0.01, math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))))
+        near = np.nonzero((flat >= lat_lo) & (flat <= lat_hi) &
+                          (flng >= clng[sel].min() - reach_lng) & (flng <= clng[sel].max() + reach_lng))[0]
+        if not len(near):
+            continue
+        d = haversine_m_np(clat[sel, None], clng[sel, None], flat[near][None, :], flng[near][None, :])
+        d[d > KNN_MAX_RADIUS_M] = np.inf
+        n = min(k, len(near))
+        part = np.argpartition(d, n - 1, axis=1)[:, :n]
+        pd = np.take_along_axis(d, part, axis=1)
+        ranked = np.argsort(pd, axis=1, kind="stable")
+        part, pd = np.take_along_axis(part, ranked, axis=1), np.take_along_axis(pd, ranked, axis=1)
+        keys[sel, :n] = np.where(np.isfinite(pd), fkey[near][part], -1)
+        if n == k:
+            kth[sel] = pd[:, k - 1]
+    return keys, kth
+
+_emergency_grid = None
+_emergency_grid_mtime = None
+_emergency_grid_checked = 0.0
+_emergency_grid_lock = threading.Lock()
+
+def emergency_grid():
+    """Process-wide EmergencyGrid (None until built), reopened when `flask build-emergency-grid` rewrites it."""
+    global _emergency_grid, _emergency_grid_mtime, _emergency_grid_checked
+    now = time.time()
+    if now - _emergency_grid_checked < 30:
+        return _emergency_grid
+    with _emergency_grid_lock:
+        _emergency_grid_checked = now
+        meta = os.path.join(EMERGENCY_GRID_PATH, "meta.json")
+        mtime = os.path.getmtime(meta) if os.path.exists(meta) else None
+        if mtime != _emergency_grid_mtime:
+            _emergency_grid = EmergencyGrid(EMERGENCY_GRID_PATH) if mtime else None
+            _emergency_grid_mtime = mtime
+    return _emergency_grid
+
+@app.cli.command("build-emergency-grid")
+@click.option("--incremental", is_flag=True, help="only recompute cells affected by facility changes since the last build")
+def build_emergency_grid(incremental):
+    """Precompute the mode=emergency grid from the offline facility index (FACILITY_INDEX_PATH)."""
+    index = FacilityIndex.load(FACILITY_INDEX_PATH)
+    if incremental and os.path.exists(os.path.join(EMERGENCY_GRID_PATH, "snapshot.npz")):
+        n = EmergencyGrid(EMERGENCY_GRID_PATH).update(index)
+        click.echo(f"recomputed {n} cell lists in {EMERGENCY_GRID_PATH}")
+    else:
+        n = EmergencyGrid.build(index, EMERGENCY_GRID_PATH, EMERGENCY_GRID_DEG, EMERGENCY_GRID_K)
+        click.echo(f"built {n} cells x {len(EmergencyGrid.TYPES)} types into {EMERGENCY_GRID_PATH}")
+
 # -------------------------
-# Server-side helpers & endpoints
+# Offline gazetteer (autocomplete)
 # -------------------------
 
-geolocator = Nominatim(user_agent="india_hospital_finder", timeout=10)
+def normalize_query(q):
+    """Lowercase, collapse whitespace and drop a trailing ", India"."""
+    q = re.sub(r"\s+", " ", q.strip().lower())
+    return re.sub(r"(,\s*india)+$", "", q).strip(" ,")
+
+class Gazetteer:
+    """
+    Sorted-array prefix index over place names and 6-digit PIN codes.
+    File layout: MAGIC, u32 count, u32 major count, `count` fixed-size records sorted by
+    key, the city and district records again as a sorted table of their own, then a
+    UTF-8 string blob. Each record is (u32 blob offset, u16 key length, u16 label
+    length, f32 lat, f32 lng, u8 kind). The file is memory-mapped, so startup parses
+    nothing and all workers share the same pages; lookups binary-search the records.
+    The major table lets a short prefix surface cities and districts that sort after
+    hundreds of localities sharing it ("pu" finds Pune).
+    """
+    MAGIC = b"IHFGAZ02"
+    RECORD = struct.Struct("<IHHffB3x")
+    KINDS = ("city", "district", "locality", "pincode")  # also the ranking order for suggestions
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:8] != self.MAGIC:
+            raise ValueError(f"{path}: not a gazetteer index")
+        self.count, self.major_count = struct.unpack_from("<II", self.mm, 8)
+        self.records = 16
+        self.major = self.records + self.count * self.RECORD.size
+        self.blob = self.major + self.major_count * self.RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def build(cls, rows, path):
+        """rows: dicts with name, kind, lat, lng and optional district/state."""
+        entries = []
+        for row in rows:
+            kind = row["kind"].strip().lower()
+            if kind not in cls.KINDS:
+                continue
+            name = row["name"].strip()
+            parts = [name] + [row[k].strip() for k in ("district", "state") if row.get(k) and row[k].strip() != name]
+            label = ", ".join(parts)
+            lat, lng = float(row["lat"]), float(row["lng"])
+            # index both the bare name and the full label, so "pune" and "pune, maharashtra" both resolve
+            for key in dict.fromkeys((normalize_query(name), normalize_query(label))):
+                entries.append((key.encode(), label.encode(), lat, lng, cls.KINDS.index(kind)))
+        entries.sort(key=lambda e: (e[0], e[4]))
+        blob = bytearray()
+        table = bytearray()
+        major = bytearray()
+        major_count = 0
+        for key, label, lat, lng, kind in entries:
+            record = cls.RECORD.pack(len(blob), len(key), len(label), lat, lng, kind)
+            table += record
+            if cls.KINDS[kind] in ("city", "district"):
+                major += record
+                major_count += 1
+            blob += key + label
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(cls.MAGIC + struct.pack("<II", len(entries), major_count) + bytes(table) + bytes(major) + bytes(blob))
+        os.replace(tmp, path)
+        return len(entries)
+
+    def _record(self, i, table=None):
+        return self.RECORD.unpack_from(self.mm, (table or self.records) + i * self.RECORD.size)
+
+    def _key(self, i, table=None):
+        off, klen, _, _, _, _ = self._record(i, table)
+        start = self.blob + off
+        return self.mm[start:start + klen]
+
+    def _entry(self, i, table=None):
+        off, klen, llen, lat, lng, kind = self._record(i, table)
+        start = self.blob + off + klen
+        return {
+            "name": self.mm[start:start + llen].decode(),
+            "kind": self.KINDS[kind],
+            "lat": round(lat, 5),  # float32 storage: ~1 m precision
+            "lng": round(lng, 5),
+        }
+
+    def _lower_bound(self, key, table=None, count=None):
+        lo, hi = 0, self.count if count is None else count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid, table) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix(self, q, limit=AUTOCOMPLETE_LIMIT, scan=64):
+        """Suggestions whose key starts with q: exact matches first, then by kind and key length."""
+        key = normalize_query(q).encode()
+        if not key:
+            return []
+        hits, seen = [], set()
+        for table, count in ((self.major, self.major_count), (self.records, self.count)):
+            i, n = self._lower_bound(key, table, count), 0
+            while i < count and n < scan:
+                k = self._key(i, table)
+                if not k.startswith(key):
+                    break
+                entry = self._entry(i, table)
+                if entry["name"] not in seen:  # name and label keys point at the same place
+                    seen.add(entry["name"])
+                    hits.append((k != key, self.KINDS.index(entry["kind"]), len(k), entry))
+                    n += 1
+                i += 1
+        hits.sort(key=lambda h: h[:3])
+        return [h[3] for h in hits[:limit]]
+
+    def exact(self, q):
+        """Best entry whose key equals the normalized query, or None."""
+        key = normalize_query(q).encode()
+        i = self._lower_bound(key)
+        return self._entry(i) if key and i < self.count and self._key(i) == key else None
+
+gazetteer = Gazetteer(GAZETTEER_PATH) if os.path.exists(GAZETTEER_PATH) else None
+
+@app.cli.command("build-gazetteer")
+@click.argument("sources", nargs=-1, required=True)
+def build_gazetteer(sources):
+    """
+    Compile CSV gazetteers into GAZETTEER_PATH.
+    Each CSV needs a header with name, kind (city|district|locality|pincode), lat, lng
+    and optionally district, state. For PIN codes, name is the 6-digit code.
+    """
+    rows = []
+    for src in sources:
+        with open(src, newline="", encoding="utf-8") as f:
+            rows.extend(csv.DictReader(f))
+    n = Gazetteer.build(rows, GAZETTEER_PATH)
+    click.echo(f"indexed {n} gazetteer keys into {GAZETTEER_PATH}")
+
+# -------------------------
+# Road network (ETA matrix)
+# -------------------------
+
+# typical driving speeds (km/h) per OSM highway class; a lower maxspeed tag wins
+ROAD_SPEEDS_KMH = {
+    "motorway": 80, "motorway_link": 40, "trunk": 60, "trunk_link": 35,
+    "primary": 45, "primary_link": 30, "secondary": 35, "secondary_link": 25,
+    "tertiary": 30, "tertiary_link": 20, "unclassified": 25, "road": 20,
+    "residential": 20, "living_street": 10, "service": 15,
+}
+ACCESS_SPEED_MS = ROAD_SPEEDS_KMH["service"] / 3.6  # for the straight-line legs to and from the snapped nodes
+
+# Overpass QL used by `flask build-road-graph --bbox` when no dump file is given
+ROAD_NETWORK_QUERY = """
+[out:json][timeout:900];
+way["highway"~"^({classes})$"]({bbox});
+(._;>;);
+out body qt;
+"""
+
+class RoadGraph:
+    """
+    Directed road graph in CSR form: edges leaving node u are indices[indptr[u]:indptr[u+1]]
+    with travel times in `seconds` and lengths in `meters`. Only junctions (way ends and
+    nodes shared by several ways) are nodes; the shape points between them are folded into
+    the edge. Nodes are sorted by grid cell, like FacilityIndex, for snapping.
+    """
+    CELL_DEG = 0.01  # ~1.1 km at the equator
+
+    def __init__(self, lat, lng, indptr, indices, seconds, meters):
+        self.lat, self.lng = lat, lng
+        self.indptr, self.indices, self.seconds, self.meters = indptr, indices, seconds, meters
+        self.cells = {}
+        cy = np.floor(lat / self.CELL_DEG).astype(np.int64)
+        cx = np.floor(lng / self.CELL_DEG).astype(np.int64)
+        for i in range(len(lat)):
+            key = (int(cy[i]), int(cx[i]))
+            start, _ = self.cells.get(key, (i, i))
+            self.cells[key] = (start, i + 1)
+        # memoryviews index to plain Python numbers much faster than the arrays do in the search loop
+        self._adj = tuple(memoryview(np.ascontiguousarray(a)) for a in (indptr, indices, seconds, meters))
+
+    def __len__(self):
+        return len(self.lat)
+
+    @staticmethod
+    def _speed_ms(tags):
+        kmh = ROAD_SPEEDS_KMH[tags["highway"]]
+        m = re.match(r"\d+", tags.get("maxspeed", ""))
+        return min(kmh, int(m.group())) / 3.6 if m and int(m.group()) > 0 else kmh / 3.6
+
+    @staticmethod
+    def _oneway(tags):
+        """1: along the way only, -1: against it only, 0: both directions."""
+        value = tags.get("oneway")
+        if value in ("yes", "true", "1"):
+            return 1
+        if value == "-1":
+            return -1
+        if value is None and (tags["highway"] in ("motorway", "motorway_link") or tags.get("junction") in ("roundabout", "circular")):
+            return 1
+        return 0
+
+    @classmethod
+    def from_overpass(cls, elements):
+        coords, ways = {}, []
+        for el in elements:
+            if el.get("type") == "node":
+                coords[el["id"]] = (el["lat"], el["lon"])
+            elif el.get("type") == "way" and el.get("tags", {}).get("highway") in ROAD_SPEEDS_KMH:
+                if el["tags"].get("access") not in ("no", "private") and el["tags"].get("motor_vehicle") not in ("no", "private"):
+                    ways.append(el)
+        ways = [(w["tags"], [n for n in w["nodes"] if n in coords]) for w in ways]
+        ways = [(tags, nodes) for tags, nodes in ways if len(nodes) >= 2]
+        uses = {}
+        for _, nodes in ways:
+            for n in (nodes[0], nodes[-1], *nodes):  # way ends count twice, so they are always junctions
+                uses[n] = uses.get(n, 0) + 1
+        src, dst, secs, lens = array("q"), array("q"), array("d"), array("d")
+        for tags, nodes in ways:
+            speed, oneway = cls._speed_ms(tags), cls._oneway(tags)
+            pts = np.array([coords[n] for n in nodes], dtype=np.float64)
+            seg = haversine_m_np(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+            start, acc = nodes[0], 0.0
+            for n, m in zip(nodes[1:], seg.tolist()):
+                acc += m
+                if uses[n] < 2:
+                    continue
+                if n != start:
+                    pairs = ((start, n),) * (oneway >= 0) + ((n, start),) * (oneway <= 0)
+                    for a, b in pairs:
+                        src.append(a); dst.append(b); secs.append(acc / speed); lens.append(acc)
+                start, acc = n, 0.0
+        return cls._build(coords, np.array(src), np.array(dst), np.array(secs), np.array(lens))
+
+    @classmethod
+    def _build(cls, coords, src, dst, secs, lens):
+        ids, inverse = np.unique(np.concatenate([src, dst]), return_inverse=True)
+        src, dst = inverse[:len(src)], inverse[len(src):]
+        # keep the largest connected component: snapping onto an island would leave every target unreachable
+        parent = list(range(len(ids)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in zip(src.tolist(), dst.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[ra] = rb
+        roots = np.array([find(i) for i in range(len(ids))], dtype=np.int64)
+        main = roots == np.bincount(roots).argmax()
+        keep = main[src]
+        src, dst, secs, lens = src[keep], dst[keep], secs[keep], lens[keep]
+        ids = ids[main]
+        lat = np.array([coords[i][0] for i in ids.tolist()], dtype=np.float64)
+        lng = np.array([coords[i][1] for i in ids.tolist()], dtype=np.float64)
+        # renumber: dropped nodes out, remaining ones sorted by grid cell
+        order = np.lexsort((np.floor(lng / cls.CELL_DEG), np.floor(lat / cls.CELL_DEG)))
+        renumber = np.full(len(main), -1, dtype=np.int64)
+        renumber[np.nonzero(main)[0][order]] = np.arange(len(order))
+        src, dst = renumber[src], renumber[dst]
+        by_src = np.argsort(src, kind="stable")
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=len(order)))]).astype(np.int64)
+        return cls(lat[order], lng[order], indptr, dst[by_src].astype(np.int32),
+                   secs[by_src].astype(np.float32), lens[by_src].astype(np.float32))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(*(z[k] for k in ("lat", "lng", "indptr", "indices", "seconds", "meters")))
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, lat=self.lat, lng=self.lng, indptr=self.indptr, indices=self.indices,
+                     seconds=self.seconds, meters=self.meters)
+        os.replace(tmp, path)
+
+    def snap(self, lat, lng, max_m):
+        """(node, distance_m) of the nearest node within max_m of (lat, lng), or (None, None)."""
+        cell = self.CELL_DEG
+        dlat = max_m / 111320.0
+        dlng = max_m / (111320.0 * max(0.01, math.cos(math.radians(lat))))
+        spans = []
+        for cy in range(int(math.floor((lat - dlat) / cell)), int(math.floor((lat + dlat) / cell)) + 1):
+            for cx in range(int(math.floor((lng - dlng) / cell)), int(math.floor((lng + dlng) / cell)) + 1):
+                span = self.cells.get((cy, cx))
+                if span:
+                    spans.append(np.arange(*span))
+        if not spans:
+            return None, None
+        idx = np.concatenate(spans)
+        d = haversine_m_np(lat, lng, self.lat[idx], self.lng[idx])
+        best = int(np.argmin(d))
+        return (int(idx[best]), float(d[best])) if d[best] <= max_m else (None, None)
+
+    def travel_times(self, source, targets, max_seconds):
+        """
+        One-to-many Dijkstra from node `source`. Stops as soon as every target is settled
+        or the frontier passes max_seconds. Returns {target: (seconds, meters)} for the
+        targets reached.
+        """
+        indptr, indices, seconds, meters = self._adj
+        remaining = set(targets)
+        best = {source: 0.0}
+        length = {source: 0.0}
+        heap = [(0.0, source)]
+        out = {}
+        while heap and remaining:
+            t, u = heapq.heappop(heap)
+            if t > best[u]:
+                continue  # stale entry, u was settled with a shorter time
+            if t > max_seconds:
+                break
+            if u in remaining:
+                remaining.discard(u)
+                out[u] = (t, length[u])
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                tv = t + seconds[e]
+                if tv < best.get(v, math.inf):
+                    best[v] = tv
+                    length[v] = length[u] + meters[e]
+                    heapq.heappush(heap, (tv, v))
+        return out
+
+road_graph = RoadGraph.load(ROAD_GRAPH_PATH) if os.path.exists(ROAD_GRAPH_PATH) else None
+
+@app.cli.command("build-road-graph")
+@click.argument("dump", required=False)
+@click.option("--bbox", help="south,west,north,east to download from Overpass when no DUMP is given")
+def build_road_graph(dump, bbox):
+    """Compile an Overpass JSON dump of highway ways (with their nodes) into ROAD_GRAPH_PATH."""
+    if dump:
+        with open(dump) as f:
+            elements = json.load(f).get("elements", [])
+    elif bbox:
+        q = ROAD_NETWORK_QUERY.format(classes="|".join(ROAD_SPEEDS_KMH), bbox=bbox)
+        with upstream_stream("overpass", "POST", overpass_pool.ranked()[0].url, data=q,
+                             timeout=(UPSTREAM_CONNECT_TIMEOUT, 1000)) as r:
+            r.raise_for_status()
+            elements = list(iter_overpass_elements(r))
+    else:
+        raise click.UsageError("give a DUMP file or --bbox")
+    graph = RoadGraph.from_overpass(elements)
+    graph.save(ROAD_GRAPH_PATH)
+    click.echo(f"built a road graph with {len(graph)} nodes and {len(graph.indices)} edges into {ROAD_GRAPH_PATH}")
+
+# -------------------------
+# Caches
+# -------------------------
+
+class TTLCache:
+    """Thread-safe in-process LRU with per-entry expiry; hits/misses are counted under `name`."""
+
+    def __init__(self, maxsize, name):
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] < time.time():
+                del self._data[key]
+                item = None
+            if item is None:
+                CACHE_LOOKUPS.labels(self.name, "miss").inc()
+                return None
+            self._data.move_to_end(key)
+        CACHE_LOOKUPS.labels(self.name, "hit").inc()
+        return item[0]
+
+    def has(self, key):
+        """Like get() but not counted as a lookup (used by prefetching)."""
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[1] >= time.time()
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+def _offload(fn):
+    """Run a blocking call gevent can't make cooperative on its native threadpool (async workers only)."""
+    monkey = sys.modules.get("gevent.monkey")
+    if monkey is not None and monkey.is_module_patched("socket"):
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn)
+    return fn()
+
+class SharedCache:
+    """
+    Cache shared by every worker process: one SQLite database in WAL mode, so readers
+    in all workers proceed concurrently with a writer and an entry fetched by one worker
+    is a hit for the others. Entries live in namespaces (geocode, search, details) and
+    are stored as zlib-compressed compact JSON. Every EVICT_EVERY writes the file is
+    trimmed back under max_bytes by dropping the entries closest to expiry.
+    """
+
+    EVICT_EVERY = 128
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._reset_pool()
+        # create the schema (and switch the file to WAL) up front, on a connection that is
+        # closed again, so a preload_app master hands no open connection to its workers
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                     "ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                     "expires REAL NOT NULL, PRIMARY KEY (ns, key)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+        conn.commit()
+        conn.close()
+        os.register_at_fork(after_in_child=self._reset_pool)
+
+    def _reset_pool(self):
+        # a small shared pool rather than thread-locals: under async (gevent) workers
+        # every greenlet is its own "thread" and would open its own connection. A deque,
+        # not a queue.Queue, since it is also used from gevent's native threadpool
+        self._pool = deque()
+
+    @contextmanager
+    def _db(self):
+        try:
+            conn = self._pool.pop()
+        except IndexError:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; a crash may lose the last writes
+        try:
+            with conn:
+                yield conn
+        finally:
+            if len(self._pool) < SQLITE_POOL_SIZE:
+                self._pool.append(conn)
+            else:
+                conn.close()
+
+    def _run(self, fn, *args):
+        # gevent doesn't patch sqlite3: a query or lock wait would block every greenlet of
+        # the worker, so in async workers the query runs on gevent's native threadpool
+        def call():
+            with self._db() as conn:
+                return fn(conn, *args)
+        return _offload(call)
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, separators=(",", ":"))
+
+    def get(self, ns, key):
+        """(value, remaining ttl) or (None, 0)."""
+        row = self._run(lambda conn: conn.execute("SELECT value, expires FROM cache WHERE ns=? AND key=?",
+                                                  (ns, self._key(key))).fetchone())
+        ttl = row[1] - time.time() if row else 0
+        if ttl <= 0:
+            CACHE_LOOKUPS.labels(f"{ns}_shared", "miss").inc()
+            return None, 0
+        CACHE_LOOKUPS.labels(f"{ns}_shared", "hit").inc()
+        return json.loads(zlib.decompress(row[0])), ttl
+
+    def has(self, ns, key):
+        return self._run(lambda conn: conn.execute("SELECT 1 FROM cache WHERE ns=? AND key=? AND expires>?",
+                                                   (ns, self._key(key), time.time())).fetchone()) is not None
+
+    def set(self, ns, key, value, ttl):
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode(), 6)
+        self._run(lambda conn: conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                                            (ns, self._key(key), blob, len(blob), time.time() + ttl)))
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the ones closest to expiry until under 90% of max_bytes."""
+        self._run(self._evict)
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess, cutoff = total - self.max_bytes * 0.9, None
+        for expires, size in conn.execute("SELECT expires, size FROM cache ORDER BY expires"):
+            excess -= size
+            cutoff = expires
+            if excess <= 0:
+                break
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (cutoff,))
+
+    def stats(self):
+        rows = self._run(lambda conn: conn.execute("SELECT ns, COUNT(*), SUM(size) FROM cache GROUP BY ns").fetchall())
+        return {ns: {"entries": n, "bytes": size} for ns, n, size in rows}
+
+shared_cache = SharedCache(CACHE_PATH, CACHE_MAX_BYTES)
+
+class TieredCache(TTLCache):
+    """TTLCache in front of a namespace (its name) of the shared cache; shared hits are copied in."""
+
+    def __init__(self, maxsize, name, shared):
+        super().__init__(maxsize, name)
+        self.shared = shared
+
+    def get(self, key):
+        value = super().get(key)
+        if value is None:
+            value, ttl = self.shared.get(self.name, key)
+            if value is not None:
+                super().set(key, value, ttl)
+        return value
+
+    def has(self, key):
+        return super().has(key) or self.shared.has(self.name, key)
+
+    def set(self, key, value, ttl):
+        super().set(key, value, ttl)
+        self.shared.set(self.name, key, value, ttl)
+
+class GeocodeCache:
+    """
+    Two-tier geocode cache: TTLCache (per process) in front of the "geocode" namespace of
+    the shared cache, which survives restarts. Keys are (provider, normalized query);
+    payloads are the JSON bodies /api/geocode returns, including negative answers.
+    """
+
+    def __init__(self, shared, maxsize):
+        self.shared = shared
+        self.memory = TTLCache(maxsize, "geocode_memory")
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    normalize = staticmethod(normalize_query)
+
+    def get(self, provider, q):
+        key = (provider, self.normalize(q))
+        payload = self.memory.get(key)
+        if payload is not None:
+            self.stats["memory_hits"] += 1
+            return payload
+        payload, ttl = self.shared.get("geocode", key)
+        if payload is not None:
+            self.stats["disk_hits"] += 1
+            self.memory.set(key, payload, ttl)
+            return payload
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, provider, q, payload):
+        key = (provider, self.normalize(q))
+        ttl = GEOCODE_TTL[provider] if payload.get("ok") else GEOCODE_NEGATIVE_TTL
+        self.memory.set(key, payload, ttl)
+        self.shared.set("geocode", key, payload, ttl)
+        self.stats["stores"] += 1
+
+geocode_cache = GeocodeCache(shared_cache, GEOCODE_CACHE_SIZE)
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key: one caller runs fn, the rest wait for its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """(future, leader) for key; the leader must settle the future with finish()."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, False
+            fut = self._calls[key] = Future()
+            return fut, True
+
+    def finish(self, key, fut, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(error)
+
+    def do(self, key, fn):
+        fut, leader = self.join(key)
+        if leader:
+            try:
+                self.finish(key, fut, fn())
+            except Exception as e:
+                self.finish(key, fut, error=e)
+        return fut.result()
+
+# -------------------------
+# Nearby search
+# -------------------------
+
+def _google_nearby(lat, lng, radius, typ):
+    # Map our typ to Google place types or keywords
+    keyword = "hospital" if typ in ["hospital","all"] else ("clinic" if typ=="clinic" else typ)
+    url = f"{GOOGLE_MAPS_API}/place/nearbysearch/json"
+    params = {
+        "key": GOOGLE_API_KEY,
+        "location": f"{lat},{lng}",
+        "radius": int(radius),
+        "keyword": keyword,
+    }
+    r = upstream("google_places", "GET", url, params=params)
+    with timed("parse"):
+        j = r.json()
+    _google_status("google_places", j)
+    results = []
+    for p in j.get("results", []):
+        loc = p.get("geometry", {}).get("location", {})
+        results.append({
+            "name": p.get("name"),
+            "address": p.get("vicinity"),
+            "lat": loc.get("lat"),
+            "lng": loc.get("lng"),
+            "rating": p.get("rating"),
+            "place_id": p.get("place_id"),
+        })
+    return results
+
+def _overpass_selector(typ):
+    # the requested type's amenities
+    amenities = "|".join(TYPE_AMENITIES.get(typ, OSM_AMENITIES))
+    speciality = '["healthcare:speciality"~"psychiatry"]' if typ == "mental_health" else ""
+    return f'nwr["amenity"~"^({amenities})$"]{speciality}'
+
+_json_decoder = json.JSONDecoder()
+_ELEMENTS_START = re.compile(r'"elements"\s*:\s*\[')
+_ELEMENT_SEP = re.compile(r"[\s,]*")
+
+_REMARK = re.compile(r'"remark"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+def _overpass_remark(text):
+    # runtime errors (timeouts, out of memory) come back as 200 with a "remark" and
+    # whatever elements were produced before the error
+    m = _REMARK.search(text)
+    remark = json.loads(m.group(1)) if m else ""
+    if "error" in remark:
+        raise UpstreamError(f"overpass: {remark}")
+
+def iter_overpass_elements(r):
+    """
+    Yield the "elements" of a streamed Overpass JSON response one by one as their
+    bytes arrive, without holding the whole body or its parsed tree in memory.
+    The rest of the body is read after the array, and an Overpass runtime error there
+    raises UpstreamError, so callers never cache a partial or empty result as complete.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buf, pos = "", None  # pos: where the next element starts, once inside the array
+    head, tail = "", None  # the body around the array; tail is None until the array ends
+    nbytes, parse_s = 0, 0.0
+    try:
+        for chunk in r.iter_content(chunk_size=16384):
+            nbytes += len(chunk)
+            t0 = time.perf_counter()
+            buf += decoder.decode(chunk)
+            if tail is not None:
+                tail += buf
+                buf = ""
+                parse_s += time.perf_counter() - t0
+                continue
+            if pos is None:
+                m = _ELEMENTS_START.search(buf)
+                if m:
+                    head, pos = buf[:m.start()], m.end()
+            elements = []
+            while pos is not None:
+                pos = _ELEMENT_SEP.match(buf, pos).end()
+                if pos >= len(buf):
+                    break
+                if buf[pos] == "]":
+                    tail, buf, pos = buf[pos + 1:], "", None
+                    break
+                try:
+                    el, pos = _json_decoder.raw_decode(buf, pos)
+                except ValueError:
+                    break  # element not complete yet, wait for more bytes
+                elements.append(el)
+            if pos:
+                buf, pos = buf[pos:], 0
+            parse_s += time.perf_counter() - t0
+            yield from elements
+        if tail is None:
+            _overpass_remark(head + buf)
+            raise UpstreamError("overpass: truncated response")
+        _overpass_remark(head + tail + decoder.decode(b"", final=True))
+    finally:
+        UPSTREAM_BYTES.labels("overpass").inc(nbytes)
+        PHASE_LATENCY.labels("parse").observe(parse_s)
+        _record_timing("parse", parse_s)
+
+def _overpass_query(statements, timeout):
+    # uncapped: Overpass returns elements in id order, so a count limit would drop
+    # arbitrary (not the farthest) facilities; results are bounded by the around: radius
+    return f"[out:json][timeout:{timeout}];\n{statements}\nout center;"
+
+def _overpass_elements(url, q):
+    with upstream_stream("overpass", "POST", url, data=q) as r:
+        r.raise_for_status()
+        for el in iter_overpass_elements(r):
+            yield _osm_result(el)
+
+def _overpass_stream(statements, timeout=25):
+    """
+    Overpass QL results yielded as they are decoded, from the best mirror. A stream
+    can't be hedged, but a mirror that fails before its first result is failed over.
+    """
+    q = _overpass_query(statements, timeout)
+    candidates = overpass_pool.ranked()
+    for n, endpoint in enumerate(candidates):
+        started, t0 = False, time.perf_counter()
+        try:
+            for p in _overpass_elements(endpoint.url, q):
+                if not started:
+                    # time to first result; the rest of the stream is paced by our reader
+                    endpoint.record(time.perf_counter() - t0, True)
+                    started = True
+                yield p
+        except Exception as e:
+            if _endpoint_fault(e):
+                endpoint.record(time.perf_counter() - t0, False)
+            if started or n == len(candidates) - 1 or not _endpoint_fault(e):
+                raise
+            UPSTREAM_FAILOVERS.labels("overpass").inc()
+            continue
+        if not started:
+            endpoint.record(time.perf_counter() - t0, True)
+        return
+
+def _overpass_run(statements, timeout=25):
+    # hedged across the mirrors (see EndpointPool.call)
+    q = _overpass_query(statements, timeout)
+    return overpass_pool.call(lambda url: list(_overpass_elements(url, q)))
+
+def _overpass_around(lat, lng, radius, typ, inner_radius=0):
+    # Overpass query around point (with inner_radius: only the ring between inner_radius and radius)
+    selector = _overpass_selector(typ)
+    around = f"{selector}(around:{int(radius)},{lat},{lng});"
+    if inner_radius:
+        around = f"({around} - {selector}(around:{int(inner_radius)},{lat},{lng}););"
+    return around
+
+def _overpass_nearby(lat, lng, radius, typ, inner_radius=0):
+    return _overpass_run(_overpass_around(lat, lng, radius, typ, inner_radius))
+
+def _overpass_nearby_multi(centers, radius, typ):
+    # one union query with an around: clause per center
+    selector = _overpass_selector(typ)
+    union = "(" + " ".join(f"{selector}(around:{int(radius)},{lat},{lng});" for lat, lng in centers) + ");"
+    return _overpass_run(union, timeout=60)
+
+def _tile(lat, lng):
+    return int(math.floor(lat / SEARCH_TILE_DEG)), int(math.floor(lng / SEARCH_TILE_DEG))
+
+def _tile_center(ty, tx):
+    return (ty + 0.5) * SEARCH_TILE_DEG, (tx + 0.5) * SEARCH_TILE_DEG
+
+def _tile_reach_m(ty):
+    """Distance from a tile's center to its farthest corner (tiles are widest on their equator-side edge)."""
+    half_lat = SEARCH_TILE_DEG / 2 * 111320.0
+    half_lng = half_lat * math.cos(math.radians(min(abs(ty), abs(ty + 1)) * SEARCH_TILE_DEG))
+    return math.hypot(half_lat, half_lng)
+
+search_cache = TieredCache(SEARCH_CACHE_SIZE, "search", shared_cache)
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+search_flight = SingleFlight()
+
+def fetch_tile(typ, ty, tx):
+    """
+    Upstream results for one grid tile: a query centered on the tile wide enough that
+    every point inside the tile has its full SEARCH_RADIUS_M circle covered.
+    Cached for SEARCH_CACHE_TTL; concurrent misses share one upstream call.
+    """
+    clat, clng = _tile_center(ty, tx)
+    radius = SEARCH_RADIUS_M + _tile_reach_m(ty)
+    return _cached_fetch((typ, ty, tx), lambda fetcher: fetcher(clat, clng, radius, typ))
+
+def _cached_fetch(key, fetch):
+    if use_google():
+        try:
+            return _cached_fetch_from("google", _google_nearby, key, fetch)
+        except GoogleQuotaError:
+            UPSTREAM_FAILOVERS.labels("google_places").inc()  # google_breaker now sends searches to OSM
+    return _cached_fetch_from("overpass", _overpass_nearby, key, fetch)
+
+def _cached_fetch_from(provider, fetcher, key, fetch):
+    key = (provider,) + key
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+
+    def leader():
+        results = [p for p in fetch(fetcher) if p["lat"] is not None and p["lng"] is not None]
+        search_cache.set(key, results, SEARCH_CACHE_TTL)
+        return results
+
+    return search_flight.do(key, leader)
+
+def _knn_ring_radius(ty, ring):
+    return min(KNN_START_RADIUS_M * KNN_GROWTH ** ring, KNN_MAX_RADIUS_M + _tile_reach_m(ty))
+
+def fetch_ring(typ, ty, tx, ring):
+    """
+    Results in the ring-th annulus around a tile's center (ring 0 is a full disc); cached
+    like tiles. Always from Overpass: Places Nearby returns at most 20 results ranked by
+    prominence and has no annulus filter, so it can't answer a nearest-k query.
+    """
+    clat, clng = _tile_center(ty, tx)
+    inner = _knn_ring_radius(ty, ring - 1) if ring else 0
+    outer = _knn_ring_radius(ty, ring)
+    return _cached_fetch_from("overpass", _overpass_nearby, (typ, ty, tx, "ring", ring),
+                              lambda fetcher: fetcher(clat, clng, outer, typ, inner))
+
+def _overpass_tiles(typ, tiles):
+    """Fetch several tiles of one type with a single union query and cache each tile's share."""
+    centers = [_tile_center(ty, tx) for ty, tx in tiles]
+    radius = SEARCH_RADIUS_M + max(_tile_reach_m(ty) for ty, _ in tiles)
+    places = [p for p in _overpass_nearby_multi(centers, radius, typ) if p["lat"] is not None and p["lng"] is not None]
+    lats = np.array([p["lat"] for p in places], dtype=np.float64)
+    lngs = np.array([p["lng"] for p in places], dtype=np.float64)
+    out = {}
+    for (ty, tx), (clat, clng) in zip(tiles, centers):
+        reach = SEARCH_RADIUS_M + _tile_reach_m(ty)
+        near = np.nonzero(haversine_m_np(clat, clng, lats, lngs) <= reach)[0]
+        results = [places[i] for i in near]
+        search_cache.set(("overpass", typ, ty, tx), results, SEARCH_CACHE_TTL)
+        out[(typ, ty, tx)] = results
+    return out
+
+def fetch_tiles(keys):
+    """
+    Results for many (type, ty, tx) tiles with as few upstream calls as possible.
+    Cached tiles are reused; missing Overpass tiles of one type are merged
+    OVERPASS_BATCH_TILES at a time into union queries, missing Google tiles
+    (Places has no multi-location search) are fetched one by one. Upstream
+    work fans out over batch_pool.
+    """
+    google = use_google()
+    provider = "google" if google else "overpass"
+    out, missing = {}, []
+    for key in dict.fromkeys(keys):
+        cached = search_cache.get((provider,) + key)
+        if cached is not None:
+            out[key] = cached
+        else:
+            missing.append(key)
+    if google:
+        futures = {key: batch_pool.submit(fetch_tile, *key) for key in missing}
+        out.update((key, fut.result()) for key, fut in futures.items())
+    else:
+        by_type = {}
+        for typ, ty, tx in missing:
+            by_type.setdefault(typ, []).append((ty, tx))
+        futures = [batch_pool.submit(_overpass_tiles, typ, tiles[i:i + OVERPASS_BATCH_TILES])
+                   for typ, tiles in by_type.items() for i in range(0, len(tiles), OVERPASS_BATCH_TILES)]
+        for fut in futures:
+            out.update(fut.result())
+    return out
+
+def search_tile_cached(lat, lng, typ, max_radius_m):
+    """Nearby results for an exact point, re-ranked by distance from the cached tile."""
+    return rank_by_distance(lat, lng, fetch_tile(typ, *_tile(lat, lng)), max_radius_m)
+
+def stream_tile_search(lat, lng, typ, max_radius_m):
+    """
+    Nearby results for an exact point, yielded with distance_km as soon as each is known
+    (in upstream order, not by distance). An uncached Overpass tile is streamed straight
+    from the response parser and cached once complete; the stream is registered in
+    search_flight, so concurrent requests for the tile (streamed or not) wait for it instead
+    of going upstream. Cached tiles, tiles another request is already fetching and Google
+    results (at most 20) are yielded ranked.
+    """
+    ty, tx = _tile(lat, lng)
+    key = ("overpass", typ, ty, tx)
+    if use_google() or search_cache.has(key):
+        yield from search_tile_cached(lat, lng, typ, max_radius_m)
+        return
+    fut, leader = search_flight.join(key)
+    if not leader:
+        yield from rank_by_distance(lat, lng, fut.result(), max_radius_m)
+        return
+    clat, clng = _tile_center(ty, tx)
+    radius = SEARCH_RADIUS_M + _tile_reach_m(ty)
+    results = []
+    try:
+        for p in _overpass_stream(_overpass_around(clat, clng, radius, typ)):
+            if p["lat"] is None or p["lng"] is None:
+                continue
+            results.append(p)
+            d = float(haversine_m_np(lat, lng, p["lat"], p["lng"]))
+            if d <= max_radius_m:
+                yield dict(p, distance_km=round(d / 1000, 3))
+        search_cache.set(key, results, SEARCH_CACHE_TTL)
+    except Exception as e:
+        search_flight.finish(key, fut, error=e)
+        raise
+    except BaseException:
+        # the client went away mid-stream (GeneratorExit); waiters must not hang on it
+        search_flight.finish(key, fut, error=UpstreamError("overpass: stream abandoned"))
+        raise
+    search_flight.finish(key, fut, results)
+
+def search_knn(lat, lng, typ, k, max_radius_m):
+    """
+    k nearest within max_radius_m, fetching geometrically growing rings around the
+    caller's tile center until the covered disc around the caller holds k results.
+    Each ring only asks upstream for its annulus, and rings are shared by every
+    caller in the tile, so widening a search reuses what was already fetched.
+    """
+    ty, tx = _tile(lat, lng)
+    clat, clng = _tile_center(ty, tx)
+    offset = float(haversine_m_np(lat, lng, clat, clng))
+    places, seen = [], set()
+    ring = 0
+    while True:
+        for p in fetch_ring(typ, ty, tx, ring):
+            key = p.get("place_id") or (p.get("osm_id"), p["lat"], p["lng"])
+            if key not in seen:
+                seen.add(key)
+                places.append(p)
+        ranked = rank_by_distance(lat, lng, places, max_radius_m)
+        outer = _knn_ring_radius(ty, ring)
+        covered = outer - offset  # every facility within this distance of the caller has been fetched
+        if covered >= max_radius_m or outer >= KNN_MAX_RADIUS_M + _tile_reach_m(ty):
+            return ranked[:k]
+        within = [p for p in ranked if p["distance_km"] * 1000 <= covered]
+        if len(within) >= k:
+            return within[:k]
+        ring += 1
+
+# -------------------------
+# Place details
+# -------------------------
+
+details_cache = TieredCache(DETAILS_CACHE_SIZE, "details", shared_cache)
+details_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="details")
+prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+_prefetching = set()
+_prefetching_lock = threading.Lock()
+
+def _google_details(place_id):
+    url = f"{GOOGLE_MAPS_API}/place/details/json"
+    r = upstream("google_details", "GET", url, params={"key": GOOGLE_API_KEY, "place_id": place_id, "fields":"name,formatted_address,formatted_phone_number,website,rating,geometry"})
+    j = r.json()
+    _google_status("google_details", j)
+    if j.get("status")=="OK":
+        res = j["result"]
+        geometry = res.get("geometry", {}).get("location", {})
+        return {
+            "ok": True,
+            "name": res.get("name"),
+            "address": res.get("formatted_address"),
+            "phone": res.get("formatted_phone_number"),
+            "website": res.get("website"),
+            "rating": res.get("rating"),
+            "lat": geometry.get("lat"),
+            "lng": geometry.get("lng")
+        }
+    return {"ok": False, "error": "not_found"}
+
+def _nominatim_lookup(place_ids):
+    """
+    Resolve OSM ids via Nominatim /lookup, NOMINATIM_LOOKUP_MAX per call.
+    Accepts N123/W456/R789 ids; a bare number (older clients) is looked up as any of the three.
+    """
+    wanted = {}
+    for pid in place_ids:
+        pid = str(pid)
+        for cand in ([pid.upper()] if pid[:1].isalpha() else [t + pid for t in "NWR"]):
+            wanted.setdefault(cand, pid)
+    found = {}
+    cands = list(wanted)
+    for start in range(0, len(cands), NOMINATIM_LOOKUP_MAX):
+        chunk = cands[start:start + NOMINATIM_LOOKUP_MAX]
+        r = upstream("nominatim", "GET", f"{NOMINATIM_URL}/lookup",
+                     params={"osm_ids": ",".join(chunk), "format": "jsonv2", "extratags": 1})
+        r.raise_for_status()
+        for el in r.json():
+            pid = wanted.get(_osm_place_id(el.get("osm_type"), el.get("osm_id")))
+            if pid is None or pid in found:
+                continue
+            extra = el.get("extratags") or {}
+            found[pid] = {
+                "ok": True,
+                "name": el.get("name") or el.get("display_name"),
+                "address": el.get("display_name"),
+                "phone": extra.get("phone") or extra.get("contact:phone"),
+                "website": extra.get("website") or extra.get("contact:website"),
+                "lat": float(el.get("lat")),
+                "lng": float(el.get("lon")),
+            }
+    return found
+
+def _details_provider(place_id):
+    # OSM ids (N123 / W456 / R789 or bare numbers) also show up with a Google key after a fallback
+    return "osm" if not GOOGLE_API_KEY or re.fullmatch(r"[NWRnwr]?\d+", str(place_id)) else "google"
+
+def place_details_many(place_ids):
+    """Details for each id (cached for DETAILS_CACHE_TTL); unknown ids map to a not_found payload."""
+    out, missing = {}, {"google": [], "osm": []}
+    for pid in dict.fromkeys(place_ids):
+        provider = _details_provider(pid)
+        cached = details_cache.get((provider, pid))
+        if cached is not None:
+            out[pid] = cached
+        else:
+            missing[provider].append(pid)
+    for provider, ids in missing.items():
+        if not ids:
+            continue
+        if provider == "google":
+            # no batch endpoint in the Places API; fan out (bounded by the google_details cap)
+            fetched = dict(zip(ids, details_pool.map(_google_details, ids)))
+        else:
+            fetched = _nominatim_lookup(ids)
+        for pid in ids:
+            payload = fetched.get(pid) or {"ok": False, "error": "not_found"}
+            if payload["ok"]:
+                details_cache.set((provider, pid), payload, DETAILS_CACHE_TTL)
+            out[pid] = payload
+    return out
+
+def prefetch_details(results):
+    """Warm the details cache for the top search results in the background."""
+    ids = []
+    with _prefetching_lock:
+        for p in results[:DETAILS_PREFETCH_COUNT]:
+            pid = p.get("place_id")
+            if pid and pid not in _prefetching and not details_cache.has((_details_provider(pid), pid)):
+                _prefetching.add(pid)
+                ids.append(pid)
+    if not ids:
+        return
+
+    def run():
+        try:
+            place_details_many(ids)
+        except Exception:
+            pass  # best effort: a click will retry the fetch
+        finally:
+            with _prefetching_lock:
+                _prefetching.difference_update(ids)
+
+    prefetch_pool.submit(run)
+
+# -------------------------
+# Index page & scripts
+# -------------------------
+
+class PrecompressedAsset:
+    """A response body built once, with a strong ETag and precomputed gzip/brotli variants."""
+
+    def __init__(self, body, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body)
+        self.variants["gzip"] = gzip.compress(body, 9, mtime=0)
+        self.variants["identity"] = body
+
+    def response(self):
+        encoding = request.accept_encodings.best_match(list(self.variants), default="identity")
+        resp = app.response_class(self.variants[encoding], mimetype=self.mimetype)
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = self.cache_control
+        # each encoding is a different byte stream, so it gets its own strong ETag
+        resp.set_etag(self.etag if encoding == "identity" else f"{self.etag}-{encoding}")
+        return resp.make_conditional(request)
+
+def _build_assets():
+    """Load the page scripts and render the index page for this provider configuration."""
+    scripts = {}
+    for name in ("google.js", "osm.js"):
+        with open(os.path.join(app.static_folder, name), "rb") as f:
+            # URLs carry a content hash, so scripts can be cached forever
+            scripts[name] = PrecompressedAsset(f.read(), "application/javascript", "public, max-age=31536000, immutable")
+    with app.app_context():
+        html = render_template("index.html", map_provider=MAP_PROVIDER, google_api_key=GOOGLE_API_KEY,
+                               asset_versions={name: a.etag[:12] for name, a in scripts.items()})
+    page = PrecompressedAsset(html.encode(), "text/html", f"public, max-age={INDEX_MAX_AGE}")
+    return page, scripts
+
+index_page, page_scripts = _build_assets()
 
 @app.route("/", methods=["GET"])
 def index():
-    return render_template_string(TEMPLATE, map_provider=MAP_PROVIDER, google_api_key=GOOGLE_API_KEY)
+    return index_page.response()
+
+@app.route("/assets/<name>", methods=["GET"])
+def asset(name):
+    script = page_scripts.get(name)
+    if script is None:
+        abort(404)
+    return script.response()
 
 @app.route("/api/geocode", methods=["POST"])
 def api_geocode():
@@ -305,142 +2078,269 @@ def api_geocode():
     q = data.get("q","").strip()
     if not q:
         return jsonify({"ok": False, "error": "Missing query"})
+    place = gazetteer.exact(q) if gazetteer else None
+    if place:
+        # exact gazetteer hit: no cache lookup or upstream call needed
+        return jsonify({"ok": True, "lat": place["lat"], "lng": place["lng"], "address": place["name"]})
+    provider = "google" if use_google() else "osm"
+    cached = geocode_cache.get(provider, q)
+    if cached is not None:
+        return jsonify(cached)
     try:
-        if GOOGLE_API_KEY:
-            # Use Google Geocoding API
-            url = f"https://maps.googleapis.com/maps/api/geocode/json"
-            r = requests.get(url, params={"address": q, "key": GOOGLE_API_KEY, "region": "in"})
-            j = r.json()
-            if j.get("status") == "OK":
-                loc = j["results"][0]["geometry"]["location"]
-                return jsonify({"ok": True, "lat": loc["lat"], "lng": loc["lng"], "address": j["results"][0]["formatted_address"]})
-            return jsonify({"ok": False, "error": "geocode_failed", "raw": j})
+        if provider == "google":
+            try:
+                # Use Google Geocoding API
+                url = f"{GOOGLE_MAPS_API}/geocode/json"
+                r = upstream("google_geocode", "GET", url, params={"address": q, "key": GOOGLE_API_KEY, "region": "in"})
+                j = r.json()
+                _google_status("google_geocode", j)
+                if j.get("status") == "OK":
+                    loc = j["results"][0]["geometry"]["location"]
+                    payload = {"ok": True, "lat": loc["lat"], "lng": loc["lng"], "address": j["results"][0]["formatted_address"]}
+                    geocode_cache.set(provider, q, payload)
+                    return jsonify(payload)
+                # only genuine misses get here (quota/auth errors raise), so they are cacheable
+                payload = {"ok": False, "error": "geocode_failed", "raw": j}
+                geocode_cache.set(provider, q, payload)
+                return jsonify(payload)
+            except GoogleQuotaError:
+                # google_breaker keeps later requests on OSM for GOOGLE_FALLBACK_COOLDOWN
+                UPSTREAM_FAILOVERS.labels("google_geocode").inc()
+                provider = "osm"
+                cached = geocode_cache.get(provider, q)
+                if cached is not None:
+                    return jsonify(cached)
+        r = upstream("nominatim", "GET", f"{NOMINATIM_URL}/search",
+                     params={"q": geocode_cache.normalize(q) + ", India", "format": "json", "limit": 1})
+        r.raise_for_status()
+        j = r.json()
+        if not j:
+            payload = {"ok": False, "error": "not_found"}
         else:
-            loc = geolocator.geocode(q + ", India")
-            if not loc: return jsonify({"ok": False, "error": "not_found"})
-            return jsonify({"ok": True, "lat": loc.latitude, "lng": loc.longitude, "address": loc.address})
+            payload = {"ok": True, "lat": float(j[0]["lat"]), "lng": float(j[0]["lon"]), "address": j[0]["display_name"]}
+        geocode_cache.set(provider, q, payload)
+        return jsonify(payload)
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/api/autocomplete", methods=["GET"])
+def api_autocomplete():
+    """GET ?q=<prefix>&limit=N -> suggestions from the offline gazetteer (places and PIN codes)."""
+    q = request.args.get("q", "")
+    if gazetteer is None:
+        return jsonify({"ok": False, "error": "autocomplete_unavailable"}), 503
+    try:
+        limit = max(1, min(int(request.args.get("limit", AUTOCOMPLETE_LIMIT)), 50))
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_params"}), 400
+    return jsonify({"ok": True, "results": gazetteer.prefix(q, limit)})
+
+@app.route("/api/geocode/stats", methods=["GET"])
+def api_geocode_stats():
+    stats = dict(geocode_cache.stats, memory_entries=len(geocode_cache.memory))
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+    return jsonify({"ok": True, "stats": stats})
+
+@app.route("/api/cache/stats", methods=["GET"])
+def api_cache_stats():
+    return jsonify({"ok": True, "shared": shared_cache.stats(), "max_bytes": shared_cache.max_bytes})
+
+@app.route("/api/upstreams/stats", methods=["GET"])
+def api_upstream_stats():
+    return jsonify({"ok": True, "overpass": [e.stats() for e in overpass_pool.endpoints],
+                    "google": {"configured": bool(GOOGLE_API_KEY), "breaker": google_breaker.state()}})
+
+def _search_lines(lat, lng, typ, max_radius, limit):
+    """
+    NDJSON body for stream=true: a result line as soon as it is found and among the `limit`
+    nearest seen so far (so a client keeping the `limit` nearest lines ends with the right
+    page), then a summary line with the total number of matches.
+    """
+    try:
+        if not GOOGLE_API_KEY and FACILITY_SOURCE == "local":
+            index = facility_index()
+            d, idx = index.radius(lat, lng, max_radius, typ)
+            found = (index.result(i, di) for di, i in zip(d, idx))
+        else:
+            found = stream_tile_search(lat, lng, typ, max_radius)
+        total, nearest = 0, []  # max-heap of (-distance, arrival, result)
+        for p in found:
+            total += 1
+            if len(nearest) < limit:
+                heapq.heappush(nearest, (-p["distance_km"], total, p))
+            elif nearest and p["distance_km"] < -nearest[0][0]:
+                heapq.heapreplace(nearest, (-p["distance_km"], total, p))
+            else:
+                continue
+            yield json.dumps(p) + "\n"
+        prefetch_details([p for _, _, p in sorted(nearest, reverse=True)[:DETAILS_PREFETCH_COUNT]])
+        yield json.dumps({"ok": True, "done": True, "total": total}) + "\n"
+    except Exception as e:
+        yield json.dumps({"ok": False, "error": str(e)}) + "\n"
+
 @app.route("/api/search_nearby", methods=["POST"])
 def api_search_nearby():
     """
-    Request JSON: { lat, lng, type }
-    If GOOGLE_API_KEY present: use Places Nearby Search (ranked by distance/rating).
+    Request JSON: { lat, lng, type, mode?, limit?, offset?, max_radius? }
+    If GOOGLE_API_KEY present: use Places Nearby Search.
     Else: use Overpass to query OSM 'amenity=hospital/clinic/pharmacy' within a radius.
+    Upstream results are cached per grid tile; the response is filtered to `type`, sorted by
+    distance (`distance_km` on each result) and paged with limit/offset. `total` is the
+    number of matches within max_radius (meters, capped at SEARCH_RADIUS_M).
+    mode=knn instead returns the nearest `k` (default offset+limit) found by expanding the
+    search radius from KNN_START_RADIUS_M, with max_radius capped at KNN_MAX_RADIUS_M. It is
+    answered from OSM (the local index or Overpass) even with GOOGLE_API_KEY, since Places
+    Nearby returns only the 20 most prominent results.
+    mode=emergency answers the same from the precomputed grid (`flask build-emergency-grid`):
+    one array slice plus a re-rank of the 3x3 surrounding cells' lists. The grid holds the
+    nearest EMERGENCY_GRID_K per cell; a larger k, or a point its lists can't answer exactly,
+    is answered from the facility index it was built from, and without a grid the request
+    is served as mode=knn.
+    stream=true (mode=radius only) answers with NDJSON instead: matches within max_radius on
+    their own line as soon as they are decoded from upstream, unordered and only while among
+    the `limit` nearest so far (offset ignored), then { ok, done, total }; a failure
+    mid-stream ends it with { ok: false, error }.
     """
     data = request.get_json() or {}
     lat = data.get("lat")
     lng = data.get("lng")
     typ = data.get("type", "hospital")
+    mode = data.get("mode", "radius")
     if lat is None or lng is None:
         return jsonify({"ok": False, "error": "missing_coords"}), 400
+    radius_cap = KNN_MAX_RADIUS_M if mode in ("knn", "emergency") else SEARCH_RADIUS_M
+    try:
+        limit = max(0, min(int(data.get("limit", SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT))
+        offset = max(0, int(data.get("offset", 0)))
+        k = max(1, min(int(data.get("k", offset + limit)), SEARCH_MAX_LIMIT))
+        max_radius = max(0.0, min(float(data.get("max_radius", radius_cap)), radius_cap))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "bad_params"}), 400
+    if typ not in TYPE_AMENITIES:
+        return jsonify({"ok": False, "error": "bad_type"}), 400
+    if mode not in ("radius", "knn", "emergency") or (data.get("stream") and mode != "radius"):
+        return jsonify({"ok": False, "error": "bad_mode"}), 400
 
     try:
-        if GOOGLE_API_KEY:
-            # Map our typ to Google place types or keywords
-            keyword = "hospital" if typ in ["hospital","all"] else ("clinic" if typ=="clinic" else typ)
-            url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-            params = {
-                "key": GOOGLE_API_KEY,
-                "location": f"{lat},{lng}",
-                "radius": 20000,  # 20 km radius; adjust as needed for coverage
-                "keyword": keyword,
-            }
-            r = requests.get(url, params=params)
-            j = r.json()
-            results = []
-            for p in j.get("results", []):
-                loc = p.get("geometry", {}).get("location", {})
-                results.append({
-                    "name": p.get("name"),
-                    "address": p.get("vicinity"),
-                    "lat": loc.get("lat"),
-                    "lng": loc.get("lng"),
-                    "rating": p.get("rating"),
-                    "place_id": p.get("place_id"),
-                })
-            return jsonify({"ok": True, "results": results})
+        lat = float(lat); lng = float(lng)
+        if data.get("stream"):
+            return Response(stream_with_context(_search_lines(lat, lng, typ, max_radius, limit)), mimetype="application/x-ndjson")
+        if mode == "emergency":
+            grid = emergency_grid()
+            if grid is not None:
+                index = facility_index()
+                hit = grid.lookup(index, lat, lng, typ, k, max_radius) if k <= grid.k else None
+                # the grid's lists are exact mostly where facilities are sparse, which is where
+                # growing a search circle is slow; elsewhere the index answers quickly
+                d, idx = hit if hit is not None else index.nearest(lat, lng, k, max_radius, typ)
+                found = [index.result(i, di) for di, i in zip(d, idx) if di <= max_radius]
+                page = found[offset:offset + limit]
+                prefetch_details(page)
+                return jsonify({"ok": True, "results": page, "total": len(found)})
+            mode = "knn"
+        if mode == "knn":
+            if FACILITY_SOURCE == "local":
+                index = facility_index()
+                d, idx = index.nearest(lat, lng, k, max_radius, typ)
+                found = [index.result(i, di) for di, i in zip(d, idx)]
+            else:
+                found = search_knn(lat, lng, typ, k, max_radius)
+            page = found[offset:offset + limit]
+            prefetch_details(page)
+            return jsonify({"ok": True, "results": page, "total": len(found)})
+        if not GOOGLE_API_KEY and FACILITY_SOURCE == "local":
+            # answer from the in-memory index, no upstream call
+            index = facility_index()
+            d, idx = index.radius(lat, lng, max_radius, typ)
+            results = [index.result(i, di) for di, i in zip(d[offset:offset + limit], idx[offset:offset + limit])]
+            prefetch_details(results)
+            return jsonify({"ok": True, "results": results, "total": len(idx)})
+        ranked = search_tile_cached(lat, lng, typ, max_radius)
+        page = ranked[offset:offset + limit]
+        prefetch_details(page)
+        return jsonify({"ok": True, "results": page, "total": len(ranked)})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route("/api/search_nearby_batch", methods=["POST"])
+def api_search_nearby_batch():
+    """
+    Request JSON: { points: [{ lat, lng, id? }, ...], types?: [...], limit?, max_radius? }
+    Response: { ok, results: [{ id, lat, lng, nearest: { type: [ranked results] } }, ...] }
+    in the order of `points`. Points sharing a grid tile share one upstream fetch, and
+    uncached tiles are merged into as few upstream queries as possible (see fetch_tiles).
+    """
+    data = request.get_json() or {}
+    points = data.get("points")
+    types = data.get("types") or ["hospital"]
+    if not isinstance(points, list) or not points:
+        return jsonify({"ok": False, "error": "missing_points"}), 400
+    if len(points) > BATCH_MAX_POINTS:
+        return jsonify({"ok": False, "error": "too_many_points"}), 400
+    if not isinstance(types, list) or any(t not in TYPE_AMENITIES for t in types):
+        return jsonify({"ok": False, "error": "bad_type"}), 400
+    try:
+        limit = max(0, min(int(data.get("limit", SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT))
+        max_radius = max(0.0, min(float(data.get("max_radius", SEARCH_RADIUS_M)), SEARCH_RADIUS_M))
+        coords = [(float(p["lat"]), float(p["lng"])) for p in points]
+    except (TypeError, ValueError, KeyError):
+        return jsonify({"ok": False, "error": "bad_params"}), 400
+
+    try:
+        if not GOOGLE_API_KEY and FACILITY_SOURCE == "local":
+            index = facility_index()
+
+            def nearest(lat, lng, typ):
+                d, idx = index.radius(lat, lng, max_radius, typ)
+                return [index.result(i, di) for di, i in zip(d[:limit], idx[:limit])]
         else:
-            # Overpass query for hospital/clinic/pharmacy around point
-            # convert type filter
-            tag = "hospital"
-            if typ=="clinic": tag="clinic"
-            elif typ=="pharmacy": tag="pharmacy"
-            elif typ=="mental_health": tag="hospital"
-            # Overpass QL
-            overpass = """
-            [out:json][timeout:25];
-            (
-              node["amenity"~"hospital|clinic|pharmacy"](around:{radius},{lat},{lng});
-              way["amenity"~"hospital|clinic|pharmacy"](around:{radius},{lat},{lng});
-              relation["amenity"~"hospital|clinic|pharmacy"](around:{radius},{lat},{lng});
-            );
-            out center 25;
-            """
-            q = overpass.format(radius=20000, lat=lat, lng=lng)
-            r = requests.post("https://overpass-api.de/api/interpreter", data=q, timeout=30)
-            data = r.json()
-            results = []
-            for el in data.get("elements", []):
-                if el.get("type") == "node":
-                    el_lat = el.get("lat")
-                    el_lon = el.get("lon")
-                else:
-                    center = el.get("center", {})
-                    el_lat = center.get("lat"); el_lon = center.get("lon")
-                name = el.get("tags", {}).get("name") or el.get("tags", {}).get("operator") or "Unknown"
-                addr = ", ".join(v for k,v in el.get("tags", {}).items() if k.startswith("addr:") ) or None
-                results.append({
-                    "name": name,
-                    "address": addr,
-                    "lat": el_lat,
-                    "lng": el_lon,
-                    "rating": None,
-                    "osm_id": el.get("id"),
-                })
-            return jsonify({"ok": True, "results": results})
+            tiles = fetch_tiles([(typ,) + _tile(lat, lng) for lat, lng in coords for typ in types])
+
+            def nearest(lat, lng, typ):
+                return rank_by_distance(lat, lng, tiles[(typ,) + _tile(lat, lng)], max_radius)[:limit]
+
+        results = []
+        for p, (lat, lng) in zip(points, coords):
+            results.append({
+                "id": p.get("id"),
+                "lat": lat,
+                "lng": lng,
+                "nearest": {typ: nearest(lat, lng, typ) for typ in types},
+            })
+        return jsonify({"ok": True, "results": results})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 @app.route("/api/place_details", methods=["POST"])
 def api_place_details():
     data = request.get_json() or {}
-    place_id = data.get("place_id")
-    # For OSM we accept osm_id as place_id and return tags
+    # For OSM we accept osm_id as place_id (N123 / W456 / R789, or a bare id)
+    place_id = data.get("place_id") or data.get("osm_id")
+    if not place_id:
+        return jsonify({"ok": False, "error": "missing_id"}), 400
     try:
-        if GOOGLE_API_KEY and place_id:
-            url = "https://maps.googleapis.com/maps/api/place/details/json"
-            r = requests.get(url, params={"key": GOOGLE_API_KEY, "place_id": place_id, "fields":"name,formatted_address,formatted_phone_number,website,rating,geometry"})
-            j = r.json()
-            if j.get("status")=="OK":
-                res = j["result"]
-                geometry = res.get("geometry", {}).get("location", {})
-                return jsonify({
-                    "ok": True,
-                    "name": res.get("name"),
-                    "address": res.get("formatted_address"),
-                    "phone": res.get("formatted_phone_number"),
-                    "website": res.get("website"),
-                    "rating": res.get("rating"),
-                    "lat": geometry.get("lat"),
-                    "lng": geometry.get("lng")
-                })
-            return jsonify({"ok": False, "error": j}), 400
-        else:
-            osm_id = data.get("place_id") or data.get("osm_id")
-            if not osm_id:
-                return jsonify({"ok": False, "error": "missing_id"}), 400
-            # For Overpass/OSM lookup use Nominatim reverse or lookup
-            # Try Nominatim lookup by OSM id (format: type/id)
-            # We'll attempt to use Nominatim search by osm_id for simplicity
-            url = "https://nominatim.openstreetmap.org/search"
-            r = requests.get(url, params={"osm_id": osm_id, "format":"json", "limit":1}, headers={"User-Agent":"india_hospital_finder"})
-            j = r.json()
-            if j:
-                el = j[0]
-                return jsonify({"ok": True, "name": el.get("display_name"), "address": el.get("display_name"), "phone": None, "website": None, "lat": float(el.get("lat")), "lng": float(el.get("lon"))})
-            return jsonify({"ok": False, "error": "not_found"})
+        place_id = str(place_id)
+        payload = place_details_many([place_id])[place_id]
+        return jsonify(payload)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route("/api/place_details_batch", methods=["POST"])
+def api_place_details_batch():
+    """
+    Request JSON: { place_ids: [...] } (at most DETAILS_BATCH_MAX)
+    Response: { ok, results: { place_id: <same payload as /api/place_details> } }
+    OSM ids are resolved with as few Nominatim /lookup calls as possible.
+    """
+    data = request.get_json() or {}
+    place_ids = data.get("place_ids")
+    if not isinstance(place_ids, list) or not place_ids:
+        return jsonify({"ok": False, "error": "missing_ids"}), 400
+    if len(place_ids) > DETAILS_BATCH_MAX:
+        return jsonify({"ok": False, "error": "too_many_ids"}), 400
+    try:
+        return jsonify({"ok": True, "results": place_details_many([str(p) for p in place_ids])})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
@@ -468,6 +2368,65 @@ def api_directions():
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/api/eta_matrix", methods=["POST"])
+def api_eta_matrix():
+    """
+    Request JSON: { origin: { lat, lng }, destinations?: [{ lat, lng, id? }, ...], type?, limit?, max_minutes? }
+    Ranks destinations by driving time over the local road graph (ROAD_GRAPH_PATH, see
+    `flask build-road-graph`) with one Dijkstra search from the origin, no routing service.
+    Without `destinations` the candidates are the `limit` nearest facilities of `type` (as
+    /api/search_nearby). Response: { ok, results } fastest first, each destination with
+    eta_s, eta_min and road_km; those unreachable within max_minutes or further than
+    ETA_MAX_SNAP_M from a road come last with nulls.
+    """
+    data = request.get_json() or {}
+    origin = data.get("origin") or {}
+    typ = data.get("type", "hospital")
+    if road_graph is None:
+        return jsonify({"ok": False, "error": "no_road_graph"}), 503
+    try:
+        lat, lng = float(origin["lat"]), float(origin["lng"])
+        limit = max(1, min(int(data.get("limit", SEARCH_DEFAULT_LIMIT)), ETA_MAX_TARGETS))
+        max_seconds = max(0.0, min(float(data.get("max_minutes", ETA_MAX_MINUTES)), ETA_MAX_MINUTES)) * 60
+        destinations = data.get("destinations")
+        if destinations is not None:
+            if not isinstance(destinations, list) or len(destinations) > ETA_MAX_TARGETS:
+                return jsonify({"ok": False, "error": "bad_destinations"}), 400
+            destinations = [dict(d, lat=float(d["lat"]), lng=float(d["lng"])) for d in destinations]
+    except (TypeError, ValueError, KeyError):
+        return jsonify({"ok": False, "error": "bad_params"}), 400
+    if typ not in TYPE_AMENITIES:
+        return jsonify({"ok": False, "error": "bad_type"}), 400
+
+    try:
+        if destinations is None:
+            if not GOOGLE_API_KEY and FACILITY_SOURCE == "local":
+                index = facility_index()
+                d, idx = index.radius(lat, lng, SEARCH_RADIUS_M, typ)
+                destinations = [index.result(i, di) for di, i in zip(d[:limit], idx[:limit])]
+            else:
+                destinations = search_tile_cached(lat, lng, typ, SEARCH_RADIUS_M)[:limit]
+        with timed("route"):
+            source, source_m = road_graph.snap(lat, lng, ETA_MAX_SNAP_M)
+            if source is None:
+                return jsonify({"ok": False, "error": "origin_off_road"}), 400
+            snapped = [road_graph.snap(d["lat"], d["lng"], ETA_MAX_SNAP_M) for d in destinations]
+            reached = road_graph.travel_times(source, {node for node, _ in snapped if node is not None}, max_seconds)
+        results = []
+        for dest, (node, snap_m) in zip(destinations, snapped):
+            seconds, meters = reached.get(node, (None, None))
+            if seconds is None:
+                results.append(dict(dest, eta_s=None, eta_min=None, road_km=None))
+                continue
+            # plus the straight-line legs between the given points and the road network
+            seconds += (source_m + snap_m) / ACCESS_SPEED_MS
+            results.append(dict(dest, eta_s=round(seconds), eta_min=round(seconds / 60, 1),
+                                road_km=round((meters + source_m + snap_m) / 1000, 3)))
+        results.sort(key=lambda r: math.inf if r["eta_s"] is None else r["eta_s"])
+        return jsonify({"ok": True, "results": results})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     # debug False in production
@@ -0,0 +1,117 @@
+// Google Maps version
+let map, service, infoWindow, userMarker;
+function initMap() {
+  map = new google.maps.Map(document.getElementById("map"), { center: { lat: 20.5937, lng: 78.9629 }, zoom: 5 });
+  infoWindow = new google.maps.InfoWindow();
+  // Autocomplete for location input
+  const input = document.getElementById('locationInput');
+  const autocomplete = new google.maps.places.Autocomplete(input, { componentRestrictions: { country: "in" }});
+  autocomplete.setFields(["geometry","formatted_address","name"]);
+  autocomplete.addListener('place_changed', () => {
+    const place = autocomplete.getPlace();
+    if (!place.geometry) return;
+    const loc = place.geometry.location;
+    map.setCenter(loc);
+    map.setZoom(13);
+  });
+}
+
+window.initMap = initMap; // for callback if needed
+
+// helpers: perform search via our backend
+async function searchNearby(lat,lng,type){
+  const r = await fetch('/api/search_nearby', {
+    method:'POST',
+    headers:{'Content-Type':'application/json'},
+    body: JSON.stringify({ lat, lng, type })
+  });
+  return r.json();
+}
+
+// on submit
+document.getElementById('searchForm').addEventListener('submit', async (e)=>{
+  e.preventDefault();
+  const manual = document.getElementById('manualLocation').value.trim();
+  let lat,lng;
+  if(manual){
+    const parts = manual.split(',');
+    if(parts.length>=2){ lat = parseFloat(parts[0]); lng = parseFloat(parts[1]); }
+  }
+  if(!lat){
+    const v = document.getElementById('locationInput').value.trim();
+    if(!v){ alert('Enter location or manual coords'); return; }
+    // geocode via backend
+    const resp = await fetch('/api/geocode', {
+      method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ q: v })
+    });
+    const j = await resp.json();
+    if(!j.ok){ alert('Location not found'); return; }
+    lat = j.lat; lng = j.lng;
+  }
+  const type = document.getElementById('typeSelect').value;
+  const json = await searchNearby(lat,lng,type);
+  renderResults(json, lat, lng);
+});
+
+let markers = [];
+function clearMarkers(){ markers.forEach(m=>m.setMap(null)); markers = []; }
+
+function renderResults(json, userLat, userLng){
+  const resultsDiv = document.getElementById('results'); resultsDiv.innerHTML = '';
+  clearMarkers();
+  if(!json.results || json.results.length === 0){ resultsDiv.innerHTML = '<p>No results nearby.</p>'; return; }
+  json.results.forEach((place, idx)=>{
+    const item = document.createElement('div'); item.className='p-2 result-item border-bottom';
+    item.innerHTML = `<b>${place.name}</b><br><small>${place.address||''}</small><br><small>Rating: ${place.rating||'N/A'}${place.distance_km!=null ? ' · '+place.distance_km+' km' : ''}</small>`;
+    item.onclick = ()=> { showDetails(place); }
+    resultsDiv.appendChild(item);
+
+    // place marker
+    const marker = new google.maps.Marker({
+      position: { lat: place.lat, lng: place.lng },
+      map,
+      title: place.name
+    });
+    marker.addListener('click', ()=> showDetails(place));
+    markers.push(marker);
+  });
+  map.setCenter({ lat: userLat, lng: userLng }); map.setZoom(13);
+}
+
+async function showDetails(place){
+  const r = await fetch('/api/place_details', {
+    method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ place_id: place.place_id })
+  });
+  const j = await r.json();
+  const html = `
+    <div class="card p-3">
+      <h5>${j.name}</h5>
+      <p>${j.address||''}</p>
+      <p>Phone: ${j.phone||'N/A'}</p>
+      <p>Website: ${j.website ? '<a href="'+j.website+'" target="_blank">'+j.website+'</a>' : 'N/A'}</p>
+      <p>Rating: ${j.rating||'N/A'}</p>
+      <div>
+        <button class="btn btn-sm btn-outline-primary" onclick="getDirections(${j.lat},${j.lng})">Get Directions</button>
+      </div>
+    </div>
+  `;
+  document.getElementById('detailCard').innerHTML = html;
+}
+
+async function getDirections(destLat, destLng){
+  // get user's location (we used last searched center)
+  const resp = await fetch('/api/directions', {
+    method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ dest: { lat: destLat, lng: destLng } })
+  });
+  const j = await resp.json();
+  if(!j.ok){ alert('Directions error'); return; }
+  // open google maps with directions
+  const url = j.google_maps_url || j.navigation_url || ('https://www.google.com/maps/dir/?api=1&destination='+destLat+','+destLng);
+  window.open(url, '_blank');
+}
+
+// initialize map after script loads
+window.addEventListener('load', ()=> {
+  // if initMap not automatically called, call it
+  if(typeof google !== 'undefined' && google.maps && !map) initMap();
+});
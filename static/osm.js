@@ -0,0 +1,124 @@
+let map = L.map('map').setView([20.5937,78.9629],5);
+L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',{ attribution:'© OpenStreetMap contributors' }).addTo(map);
+let markers = [];
+
+// suggestions from the offline gazetteer (debounced)
+let suggestTimer;
+document.getElementById('locationInput').addEventListener('input', (e)=>{
+  clearTimeout(suggestTimer);
+  const q = e.target.value.trim();
+  if(q.length < 2) return;
+  suggestTimer = setTimeout(async ()=>{
+    const r = await fetch('/api/autocomplete?q='+encodeURIComponent(q));
+    if(!r.ok) return;
+    const j = await r.json();
+    const list = document.getElementById('placeSuggestions'); list.innerHTML = '';
+    (j.results||[]).forEach(s=>{ const o = document.createElement('option'); o.value = s.name; list.appendChild(o); });
+  }, 150);
+});
+
+// results arrive as NDJSON, one place per line, and are drawn as soon as each line is read
+const RESULT_LIMIT = 25;
+
+async function searchNearby(lat,lng,type,onResult){
+  const r = await fetch('/api/search_nearby', {
+    method:'POST',
+    headers:{'Content-Type':'application/json'},
+    body: JSON.stringify({ lat, lng, type, limit: RESULT_LIMIT, stream: true })
+  });
+  if(!r.ok) return r.json();
+  const reader = r.body.getReader(), decoder = new TextDecoder();
+  let buf = '', summary = { ok:false, error:'incomplete response' };
+  for(;;){
+    const { value, done } = await reader.read();
+    if(done) break;
+    buf += decoder.decode(value, { stream:true });
+    const lines = buf.split('\n'); buf = lines.pop();
+    lines.filter(l=>l).forEach(l=>{ const o = JSON.parse(l); if('ok' in o) summary = o; else onResult(o); });
+  }
+  return summary;
+}
+
+document.getElementById('searchForm').addEventListener('submit', async (e)=>{
+  e.preventDefault();
+  const manual = document.getElementById('manualLocation').value.trim();
+  let lat,lng;
+  if(manual){
+    const parts = manual.split(',');
+    if(parts.length>=2){ lat = parseFloat(parts[0]); lng = parseFloat(parts[1]); }
+  }
+  if(!lat){
+    const v = document.getElementById('locationInput').value.trim();
+    if(!v){ alert('Enter location or manual coords'); return; }
+    const resp = await fetch('/api/geocode', {
+      method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ q: v })
+    });
+    const j = await resp.json();
+    if(!j.ok){ alert('Location not found'); return; }
+    lat = j.lat; lng = j.lng;
+  }
+  const type = document.getElementById('typeSelect').value;
+  startResults(lat, lng);
+  const summary = await searchNearby(lat,lng,type,addResult);
+  finishResults(summary);
+});
+
+function clearMarkers(){ markers.forEach(m=>map.removeLayer(m)); markers=[]; }
+
+function startResults(userLat,userLng){
+  document.getElementById('results').innerHTML = '';
+  clearMarkers();
+  map.setView([userLat,userLng],13);
+}
+
+function addResult(place){
+  // keep the list ordered by distance while results stream in
+  const resultsDiv = document.getElementById('results');
+  const item = document.createElement('div'); item.className='p-2 result-item border-bottom';
+  item.dataset.distance = place.distance_km;
+  item.innerHTML = `<b>${place.name}</b><br><small>${place.address||''}</small><br><small>Rating: ${place.rating||'N/A'}${place.distance_km!=null ? ' · '+place.distance_km+' km' : ''}</small>`;
+  item.onclick = ()=> { showDetails(place); }
+  const next = Array.from(resultsDiv.children).find(el=>parseFloat(el.dataset.distance) > place.distance_km);
+  resultsDiv.insertBefore(item, next || null);
+
+  item.marker = L.marker([place.lat, place.lng]).addTo(map).bindPopup(place.name);
+  markers.push(item.marker);
+  // the server only sends results that are among the nearest RESULT_LIMIT so far
+  if(resultsDiv.children.length > RESULT_LIMIT){
+    const farthest = resultsDiv.lastElementChild;
+    map.removeLayer(farthest.marker);
+    markers = markers.filter(m=>m!==farthest.marker);
+    farthest.remove();
+  }
+}
+
+function finishResults(summary){
+  const resultsDiv = document.getElementById('results');
+  if(!summary.ok){ resultsDiv.insertAdjacentHTML('beforeend', '<p>Search failed, please try again.</p>'); return; }
+  if(summary.total == 0){ resultsDiv.innerHTML = '<p>No results nearby.</p>'; }
+}
+
+async function showDetails(place){
+  const r = await fetch('/api/place_details', {
+    method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ place_id: place.place_id || place.osm_id })
+  });
+  const j = await r.json();
+  const html = `
+    <div class="card p-3">
+      <h5>${j.name}</h5>
+      <p>${j.address||''}</p>
+      <p>Phone: ${j.phone||'N/A'}</p>
+      <p>Website: ${j.website ? '<a href="'+j.website+'" target="_blank">'+j.website+'</a>' : 'N/A'}</p>
+      <div>
+        <button class="btn btn-sm btn-outline-primary" onclick="window.open('https://www.openstreetmap.org/?mlat=${j.lat}&mlon=${j.lng}#map=18/${j.lat}/${j.lng}','_blank')">Open in OSM</button>
+      </div>
+    </div>
+  `;
+  document.getElementById('detailCard').innerHTML = html;
+}
+
+async function getDirections(destLat,destLng){
+  // open OSM directions site or fallback to Google Maps
+  const url = `https://www.openstreetmap.org/directions?to=${destLat}%2C${destLng}`;
+  window.open(url,'_blank');
+}
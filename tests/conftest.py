@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# the app opens its shared cache at import time; keep it out of the working tree
+os.environ.setdefault("CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
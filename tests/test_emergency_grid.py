@@ -0,0 +1,104 @@
+import random
+
+import numpy as np
+import pytest
+
+from indian_hospital_finder import KNN_MAX_RADIUS_M, OSM_AMENITIES, EmergencyGrid, FacilityIndex
+
+DEG = 0.25
+K = 8
+SOUTH, WEST, NORTH, EAST = 8.0, 70.0, 32.0, 92.0
+CITIES = [(28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (22.57, 88.36)]
+
+
+def _facilities(rng, n, first_id=1):
+    # a few dense cities and sparse facilities all over, where the grid's lists are exact
+    facilities = []
+    for i in range(first_id, first_id + n):
+        if rng.random() < 0.3:
+            lat, lng = rng.choice(CITIES)
+            lat, lng = lat + rng.gauss(0, 0.2), lng + rng.gauss(0, 0.2)
+        else:
+            lat, lng = rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)
+        facilities.append({
+            "osm_type": rng.choice(("node", "way")),
+            "osm_id": i,
+            "amenity": rng.choice(OSM_AMENITIES),
+            "name": f"Facility {i}",
+            "address": "",
+            "lat": lat,
+            "lng": lng,
+            "speciality": "psychiatry" if rng.random() < 0.2 else None,
+        })
+    return facilities
+
+
+@pytest.fixture(scope="module")
+def facilities():
+    return _facilities(random.Random(7), 6000)
+
+
+@pytest.fixture(scope="module")
+def grid(facilities, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("grid"))
+    EmergencyGrid.build(FacilityIndex(facilities), path, DEG, K)
+    return EmergencyGrid(path)
+
+
+@pytest.mark.parametrize("k", [1, 3, K])
+def test_lookup_matches_index_nearest(facilities, grid, k):
+    index = FacilityIndex(facilities)
+    rng = random.Random(11)
+    answered = 0
+    for _ in range(200):
+        lat, lng = rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)
+        for typ in EmergencyGrid.TYPES:
+            hit = grid.lookup(index, lat, lng, typ, k)
+            if hit is None:  # the lists can't vouch for the answer; the caller asks the index
+                continue
+            answered += 1
+            d, rows = hit
+            want_d, want_rows = index.nearest(lat, lng, k, KNN_MAX_RADIUS_M, typ)
+            np.testing.assert_allclose(d, want_d)
+            assert index.key[rows].tolist() == index.key[want_rows].tolist()
+    if k == 1:
+        assert answered > 200 * len(EmergencyGrid.TYPES) // 2
+
+
+def test_lookup_at_cell_center(facilities, grid):
+    index = FacilityIndex(facilities)
+    lat, lng = grid.south + 50.5 * grid.deg, grid.west + 50.5 * grid.deg
+    d, rows = grid.lookup(index, lat, lng, "all", K)
+    listed = grid.keys[50, 50, EmergencyGrid.TYPES.index("all")]
+    assert index.key[rows].tolist() == listed[listed >= 0].tolist()
+
+
+def test_lookup_outside_grid(facilities, grid):
+    assert grid.lookup(FacilityIndex(facilities), 51.5, -0.12, "hospital", K) is None
+
+
+def test_update_matches_rebuild(facilities, tmp_path):
+    rng = random.Random(13)
+    changed = [dict(f) for f in facilities[200:]]  # 200 removed
+    changed += _facilities(rng, 50)  # ids 1..50 reappear elsewhere: moved, maybe retyped
+    changed += _facilities(rng, 50, first_id=10001)  # new
+    for f in changed[:20]:
+        f["lat"] += 0.05
+    for f in changed[20:40]:
+        f["amenity"] = "pharmacy" if f["amenity"] != "pharmacy" else "hospital"
+    updated, rebuilt = str(tmp_path / "updated"), str(tmp_path / "rebuilt")
+    EmergencyGrid.build(FacilityIndex(facilities), updated, DEG, K)
+    assert EmergencyGrid(updated).update(FacilityIndex(changed)) > 0
+    EmergencyGrid.build(FacilityIndex(changed), rebuilt, DEG, K)
+    a, b = EmergencyGrid(updated), EmergencyGrid(rebuilt)
+    np.testing.assert_array_equal(a.keys, b.keys)
+    np.testing.assert_array_equal(a.kth, b.kth)
+
+
+def test_lookup_refuses_other_facility_set(facilities, grid):
+    lat, lng = grid.south + 50.5 * grid.deg, grid.west + 50.5 * grid.deg
+    added = dict(facilities[0], osm_id=99999, amenity="hospital", speciality=None, lat=lat + 0.001, lng=lng)
+    assert grid.lookup(FacilityIndex(facilities), lat, lng, "all", 1) is not None
+    assert grid.lookup(FacilityIndex(facilities + [added]), lat, lng, "all", 1) is None
+    # same facilities in another order: still the grid's set
+    assert grid.lookup(FacilityIndex(facilities[::-1]), lat, lng, "all", 1) is not None
@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+
+import pytest
+
+import indian_hospital_finder as hf
+from indian_hospital_finder import SingleFlight, UpstreamError, iter_overpass_elements
+
+
+class FakeResponse:
+    def __init__(self, body, chunk=7):
+        self.body = body.encode()
+        self.chunk = chunk
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), self.chunk):
+            yield self.body[i:i + self.chunk]
+
+
+def _element(i, lat, lng, name=None):
+    tags = {"amenity": "hospital", "name": name or f"Hospital {i}"}
+    return {"type": "node", "id": i, "lat": lat, "lon": lng, "tags": tags}
+
+
+ELEMENTS = [_element(1, 15.0, 75.0, "Şifa ] {Hospital}"), _element(2, 15.01, 75.0), _element(3, 15.0, 75.02)]
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 4096])
+def test_elements_across_chunks(chunk):
+    body = json.dumps({"version": 0.6, "osm3s": {"copyright": "x"}, "elements": ELEMENTS}, indent=1)
+    assert list(iter_overpass_elements(FakeResponse(body, chunk))) == ELEMENTS
+
+
+def test_truncated_response():
+    body = json.dumps({"elements": ELEMENTS})[:-20]
+    with pytest.raises(UpstreamError, match="truncated"):
+        list(iter_overpass_elements(FakeResponse(body)))
+
+
+def test_runtime_error_remark():
+    body = json.dumps({"elements": ELEMENTS[:1], "remark": "runtime error: Query timed out in \"query\" at line 3"})
+    with pytest.raises(UpstreamError, match="timed out"):
+        list(iter_overpass_elements(FakeResponse(body)))
+
+
+def _in_threads(n, fn):
+    results, threads = [None] * n, []
+    for i in range(n):
+        def run(i=i):
+            try:
+                results[i] = fn()
+            except Exception as e:
+                results[i] = e
+        threads.append(threading.Thread(target=run))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+def test_singleflight_runs_once():
+    flight, calls = SingleFlight(), []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    assert _in_threads(5, lambda: flight.do("k", fn)) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_singleflight_shares_errors():
+    flight = SingleFlight()
+
+    def fn():
+        time.sleep(0.2)
+        raise UpstreamError("down")
+
+    assert all(isinstance(r, UpstreamError) for r in _in_threads(3, lambda: flight.do("k", fn)))
+
+
+def test_singleflight_abandoned_waiter_takes_over():
+    flight = SingleFlight()
+    fut, leader = flight.join("k")
+    assert leader
+    waiter = threading.Thread(target=lambda: results.append(flight.do("k", lambda: "fetched")))
+    results = []
+    waiter.start()
+    time.sleep(0.1)
+    flight.abandon("k", fut)
+    waiter.join(5)
+    assert results == ["fetched"]
+
+
+def _places(lat, lng):
+    return [hf._osm_result(_element(i, lat + i * 0.001, lng)) for i in (1, 2, 3)]
+
+
+def _slow_stream(places):
+    def stream(statements, timeout=25):
+        for p in places:
+            time.sleep(0.05)
+            yield p
+    return stream
+
+
+def test_stream_disconnect_lets_waiters_fetch(monkeypatch):
+    places, fetched = _places(15.0, 75.0), []
+
+    def nearby(lat, lng, radius, typ, inner_radius=0):
+        fetched.append(1)
+        return places
+
+    monkeypatch.setattr(hf, "use_google", lambda: False)
+    monkeypatch.setattr(hf, "_overpass_stream", _slow_stream(places))
+    monkeypatch.setattr(hf, "_overpass_nearby", nearby)
+
+    stream = hf.stream_tile_search(15.0, 75.0, "hospital", 5000)
+    next(stream)
+    results = []
+    plain = threading.Thread(target=lambda: results.append(hf.search_tile_cached(15.0, 75.0, "hospital", 5000)))
+    plain.start()
+    time.sleep(0.2)
+    stream.close()  # the streaming client hung up
+    plain.join(5)
+    assert fetched == [1]
+    assert [p["osm_id"] for p in results[0]] == [1, 2, 3]
+
+
+def test_stream_waiters_share_its_result(monkeypatch):
+    places = _places(16.0, 76.0)
+    monkeypatch.setattr(hf, "use_google", lambda: False)
+    monkeypatch.setattr(hf, "_overpass_stream", _slow_stream(places))
+    monkeypatch.setattr(hf, "_overpass_nearby", lambda *a, **kw: pytest.fail("went upstream twice"))
+
+    stream = hf.stream_tile_search(16.0, 76.0, "hospital", 5000)
+    streamed = [next(stream)]
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(hf.search_tile_cached(16.0, 76.0, "hospital", 5000)))
+    waiter.start()
+    streamed += list(stream)
+    waiter.join(5)
+    assert [p["osm_id"] for p in results[-1]] == sorted(p["osm_id"] for p in streamed) == [1, 2, 3]